@@ -1,51 +1,85 @@
+import sys
+
+sys.path.insert(0, 'utils')
+
 import os
 from config import config
-import joblib
-import cv2 as cv
-import numpy as np
-import gradio as gr
+from startup import StartupTimer, mark_ready
+from metrics import METRICS
+
+inference = None
+
+def get_inference():
+    """
+    Get the inference service, importing its heavy dependencies the first time it is called
+    """
+
+    global inference
+
+    if inference is None:
+        from inference import Inference
+
+        inference = Inference.from_config(config)
+
+    return inference
 
 def run(image):
     """
     Define the main function to run the models on the input image
     """
 
-    # Prepare the image
-    image = np.array(image)
-    image = cv.cvtColor(image, cv.COLOR_RGB2BGR)
-    image = cv.resize(image, (50, 50))
-    image = image.flatten()
+    return get_inference().classify([image])[0]
 
-    data = {}
+def run_batch(images: list) -> list:
+    """
+    Run the models on a batch of input images, the raw bytes of the uploads or file paths
+    """
 
-    for model_file in os.listdir(os.path.join(config.model["path"], config.model["path_models"])):
-        # Load the pre-trained model
-        model = joblib.load(os.path.join(config.model["path"], config.model["path_models"], model_file))
+    return [get_inference().classify(images)]
 
-        # Make predictions using the model
-        results = model.predict_proba([image])[0]
+if __name__ == '__main__':
+    timer = StartupTimer()
+    mark_ready(config.server["ready_file"], False)
 
-        # Find the index of the label that is not "other"
-        non_other_index = np.where(model.classes_ != 'other')[0][0]
+    with timer.phase("imports"):
+        import gradio as gr
+        get_inference()
 
-        # Populate data for bar plot
-        data[model.classes_[non_other_index]] = results[non_other_index]
-    
-    return data
+    # Load the models once and watch for new versions
+    with timer.phase("models"):
+        get_inference().start()
+
+    # Expose the inference metrics next to the Gradio server
+    if config.server["metrics"]:
+        METRICS.enabled = True
+        METRICS.serve(config.server["metrics_port"])
 
-if __name__ == '__main__':
     # Define examples
     examples = [os.path.join("test", filename) for filename in os.listdir("test")]
 
-    # Create a Gradio interface with examples
-    iface = gr.Interface(
-        title = "Ceres Project",
-        fn = run,
-        inputs = gr.Image(type = "pil"),
-        outputs = gr.Label(),
-        allow_flagging = "never",
-        examples = examples
-    )
-
-    # Launch the Gradio interface
-    iface.launch(share = True, server_name = "0.0.0.0")
+    # Run the examples before accepting requests
+    if config.server["warm_up"]:
+        with timer.phase("warm-up"):
+            get_inference().warm_up(examples)
+
+    with timer.phase("bind"):
+        # Create a Gradio interface with examples
+        iface = gr.Interface(
+            title = "Ceres Project",
+            fn = run_batch,
+            # gr.Image re-encodes the upload, the raw bytes are decoded exactly as the training images
+            inputs = gr.File(type = "binary", file_types = ["image"], label = "Image"),
+            outputs = gr.Label(),
+            allow_flagging = "never",
+            examples = examples,
+            batch = True,
+            max_batch_size = config.server["batch_size"]
+        )
+
+        # Launch the Gradio interface
+        iface.launch(share = True, server_name = "0.0.0.0", prevent_thread_lock = True)
+
+    timer.report()
+    mark_ready(config.server["ready_file"])
+
+    iface.block_thread()
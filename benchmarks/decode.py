@@ -0,0 +1,84 @@
+import sys
+
+sys.path.insert(0, 'utils')
+
+import os
+import time
+import cv2 as cv
+import numpy as np
+from imaging import IMAGE_SIZE, jpeg_size, reduction_factor, load_image
+
+def full_decode(path: str) -> np.ndarray:
+    """
+    Load an image with a full decoding, as done before decode-time downscaling.
+
+    Parameters:
+    - path (str): The path to the image.
+
+    Returns:
+    - np.ndarray: The flattened BGR image.
+    """
+
+    img = cv.imread(path)
+    img = cv.resize(img, IMAGE_SIZE)
+
+    return img.flatten()
+
+def measure(func, path: str, repeats: int) -> float:
+    """
+    Measure the mean time of loading an image.
+
+    Parameters:
+    - func (callable): The loading function.
+    - path (str): The path to the image.
+    - repeats (int): Number of measured runs.
+
+    Returns:
+    - float: Mean seconds per run.
+    """
+
+    # Warm up the decoder and the page cache
+    func(path)
+
+    time_start = time.perf_counter()
+
+    for _ in range(repeats):
+        func(path)
+
+    return (time.perf_counter() - time_start) / repeats
+
+def main(path: str = "test", repeats: int = 20) -> None:
+    """
+    Compare full decoding against decode-time downscaling on the images of a folder.
+
+    Parameters:
+    - path (str): The folder with the images.
+    - repeats (int): Number of measured runs per image.
+    """
+
+    total_full = 0
+    total_reduced = 0
+
+    for file in sorted(os.listdir(path)):
+        file_path = os.path.join(path, file)
+
+        with open(file_path, "rb") as f:
+            dimensions = jpeg_size(f.read())
+
+        factor = reduction_factor(*dimensions) if dimensions is not None else 1
+
+        time_full = measure(full_decode, file_path, repeats)
+        time_reduced = measure(load_image, file_path, repeats)
+
+        # Pixel difference against the previous preprocessing
+        difference = np.abs(full_decode(file_path).astype(np.int16) - load_image(file_path).astype(np.int16)).mean()
+
+        total_full += time_full
+        total_reduced += time_reduced
+
+        print(f"[BENCH] {file} {dimensions} reduction 1/{factor}: full {time_full * 1000:.2f} ms, reduced {time_reduced * 1000:.2f} ms, speedup {time_full / time_reduced:.2f}x, mean pixel difference {difference:.2f}")
+
+    print(f"[BENCH] Total: full {total_full * 1000:.2f} ms, reduced {total_reduced * 1000:.2f} ms, speedup {total_full / total_reduced:.2f}x")
+
+if __name__ == "__main__":
+    main(*sys.argv[1: 2])
@@ -0,0 +1,115 @@
+import sys
+
+sys.path.insert(0, 'config')
+sys.path.insert(0, 'utils')
+
+import os
+import time
+import config
+import numpy as np
+from sklearn.svm import SVC
+from feature_store import FeatureStore
+from feature_stage import FeatureStage
+from shm_loader import default_loader
+
+def load_split(store: FeatureStore, split: str) -> tuple:
+    """
+    Load the images of every class for a split.
+
+    Parameters:
+    - store (FeatureStore): The store of decoded images.
+    - split (str): The subpath of the split.
+
+    Returns:
+    - tuple: The uint8 matrix with one flattened image per row and the class of every row.
+    """
+
+    images = [].copy()
+    labels = [].copy()
+
+    for class_name in config.dataset["classes"]:
+        data, _ = store.load(path = os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name, split), name = f"{class_name}_{split}")
+
+        images.append(data.reshape(len(data), -1))
+        labels.extend([class_name] * len(data))
+
+    return np.vstack(images), np.array(labels)
+
+def run(stage: FeatureStage, training: tuple, test: tuple, latency_samples: int) -> dict:
+    """
+    Train and test a classifier of every class on the raw pixels or on the output of a feature stage.
+
+    Parameters:
+    - stage (FeatureStage): The unfitted stage, None for raw pixels.
+    - training (tuple): The training images and labels.
+    - test (tuple): The test images and labels.
+    - latency_samples (int): Number of test images predicted one by one.
+
+    Returns:
+    - dict: Fit times, latency and accuracy.
+    """
+
+    time_start = time.perf_counter()
+
+    if stage is not None:
+        stage.fit(training[0])
+
+    stage_seconds = time.perf_counter() - time_start
+
+    transform = stage.transform if stage is not None else (lambda x: x)
+
+    time_start = time.perf_counter()
+
+    model = SVC(C = 5, kernel = "rbf", probability = True)
+    model.fit(transform(training[0]), training[1])
+
+    fit_seconds = time.perf_counter() - time_start
+
+    # Single images go through the whole path, as done by app.py
+    latencies = [].copy()
+
+    for image in test[0][np.linspace(0, len(test[0]) - 1, min(latency_samples, len(test[0]))).astype(int)]:
+        time_start = time.perf_counter()
+        model.predict_proba(transform(image[None, :]))
+        latencies.append(time.perf_counter() - time_start)
+
+    return {
+        "features": transform(test[0][: 1]).shape[1],
+        "stage_seconds": stage_seconds,
+        "fit_seconds": fit_seconds,
+        "support_vectors": len(model.support_vectors_),
+        "latency_ms": float(np.percentile(latencies, 50) * 1000),
+        "accuracy": float((model.predict(transform(test[0])) == test[1]).mean())
+    }
+
+def main(latency_samples: int = 200) -> None:
+    """
+    Compare the raw-pixel baseline against the feature stages on the processed dataset.
+
+    Parameters:
+    - latency_samples (int): Number of test images predicted one by one.
+    """
+
+    store = FeatureStore(path = os.path.join(config.dataset["path"], config.dataset["path_features"]))
+
+    training = load_split(store, config.dataset["path_training"])
+    test = load_split(store, config.dataset["path_test"])
+
+    stages = {
+        "raw": None,
+        "pca": FeatureStage(method = "pca", n_components = 100, whiten = True),
+        "descriptors": FeatureStage(method = "descriptors")
+    }
+
+    baseline = None
+
+    for name, stage in stages.items():
+        r = run(stage, training, test, int(latency_samples))
+        baseline = baseline or r
+
+        print(f"[BENCH] {name}: {r['features']} features, stage fit {r['stage_seconds']:.2f} s, model fit {r['fit_seconds']:.2f} s ({baseline['fit_seconds'] / r['fit_seconds']:.2f}x), {r['support_vectors']} support vectors, latency p50 {r['latency_ms']:.2f} ms ({baseline['latency_ms'] / r['latency_ms']:.2f}x), accuracy {r['accuracy'] * 100:.2f} % ({(r['accuracy'] - baseline['accuracy']) * 100:+.2f})")
+
+    default_loader().close()
+
+if __name__ == "__main__":
+    main(*sys.argv[1: 2])
@@ -0,0 +1,332 @@
+import sys
+
+sys.path.insert(0, '.')
+sys.path.insert(0, 'utils')
+
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import importlib.util
+import cv2 as cv
+import numpy as np
+import app
+from shm_loader import default_loader
+from memory_usage import peak_rss, reset_peak_rss
+
+# Metrics compared against the baseline, True when higher is better
+METRICS = {
+    "import.images_per_second": True,
+    "model_run.seconds": False,
+    "model_test.latency_ms.p50": False,
+    "model_test.latency_ms.p99": False,
+    "model_test.images_per_second": True,
+    "app_run.latency_ms.p50": False,
+    "app_run.latency_ms.p99": False,
+    "app_run.cached_latency_ms.p50": False
+}
+
+def load_training():
+    """
+    Load scripts/03_training.py, whose name is not a valid module name.
+
+    Returns:
+    - The training module.
+    """
+
+    spec = importlib.util.spec_from_file_location("training", os.path.join("scripts", "03_training.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+def generate_dataset(path: str, classes: list[str], images: int, test_images: int, size: tuple, seed: int = 0) -> None:
+    """
+    Write a synthetic dataset with the layout of data/processed, each class with its own colours and noise.
+
+    Parameters:
+    - path (str): The destination folder.
+    - classes (list[str]): The class names.
+    - images (int): Number of training images per class.
+    - test_images (int): Number of test images per class.
+    - size (tuple): The size (width, height) of the images.
+    - seed (int): Seed of the generated images.
+    """
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+
+    # Horizontal and vertical gradients shared by every image
+    gradient = np.linspace(0, 1, width)[None, :, None] * np.linspace(0, 1, height)[:, None, None]
+
+    for c, class_name in enumerate(classes):
+        colour = rng.integers(0, 256, 3)
+
+        for split, count in (("train", images), ("test", test_images)):
+            folder = os.path.join(path, class_name, split)
+            os.makedirs(folder, exist_ok = True)
+
+            for x in range(count):
+                noise = rng.normal(0, 40, (height, width, 3))
+                image = np.clip(colour * (0.5 + gradient) + noise, 0, 255).astype(np.uint8)
+
+                cv.imwrite(os.path.join(folder, f"{class_name}_{x}.jpg"), image)
+
+def measure(func) -> tuple:
+    """
+    Run a function measuring its duration and the peak resident memory.
+
+    Parameters:
+    - func (callable): The function.
+
+    Returns:
+    - tuple: The result, the seconds and the peak RSS in MiB.
+    """
+
+    reset_peak_rss()
+    time_start = time.perf_counter()
+
+    result = func()
+
+    return result, time.perf_counter() - time_start, round(peak_rss() / (1024 * 1024), 1)
+
+def percentiles(latencies: list) -> dict:
+    """
+    Summarise latencies in milliseconds.
+
+    Parameters:
+    - latencies (list): Durations in seconds.
+
+    Returns:
+    - dict: The p50, p90 and p99 in milliseconds.
+    """
+
+    return {f"p{p}": float(np.percentile(latencies, p) * 1000) for p in (50, 90, 99)}
+
+def run(path: str, classes: list[str], repeats: int = 3) -> dict:
+    """
+    Run the training and inference phases on a synthetic dataset.
+
+    Parameters:
+    - path (str): The working folder with the dataset in processed/.
+    - classes (list[str]): The class names.
+    - repeats (int): Number of runs of the import and app.run phases, the median is reported.
+
+    Returns:
+    - dict: Throughput, latency and peak memory of every phase.
+    """
+
+    training = load_training()
+
+    a = training.Algorithm(
+        base_path = path,
+        model_path = "models",
+        model_name = f"{classes[0]}_svc_model.joblib",
+        model_grid_search = {},
+        classes = [classes[0]],
+        classes_other = classes[1:],
+        classes_path = os.path.join(path, "processed"),
+        classes_path_training = "train",
+        classes_path_test = "test"
+    )
+
+    results = {}
+
+    # Decoding the training images of every class
+    def import_all():
+        return sum(len(a.import_images(path = os.path.join(path, "processed", c, "train"), label = c)[1]) for c in classes)
+
+    # Start the worker processes of the loader before measuring
+    import_all()
+
+    runs = [measure(import_all) for _ in range(repeats)]
+    count = runs[0][0]
+    seconds = float(np.median([x[1] for x in runs]))
+
+    results["import"] = {"images": count, "seconds": seconds, "images_per_second": count / seconds, "peak_rss_mib": max(x[2] for x in runs)}
+
+    _, seconds, rss = measure(a.model_run)
+    results["model_run"] = {"images": len(a.training_labels), "seconds": seconds, "images_per_second": len(a.training_labels) / seconds, "peak_rss_mib": rss}
+
+    a.model_save()
+
+    report, seconds, rss = measure(a.model_test)
+    results["model_test"] = {"images": report["images"], "seconds": seconds, "accuracy": report["accuracy"], "latency_ms": report["latency_ms"], "images_per_second": report["batch"]["images_per_second"], "peak_rss_mib": rss}
+
+    # Serve the trained model through app.run, as the Gradio interface does
+    app.config.model["path"] = path
+    app.config.model["path_models"] = "models"
+    app.config.model["name"] = "svc_model.joblib"
+    app.config.model["compact"] = False
+
+    files = sorted(os.path.join(path, "processed", c, "test", f) for c in classes for f in os.listdir(os.path.join(path, "processed", c, "test")))
+
+    _, first_seconds, _ = measure(lambda: app.run(files[0]))
+
+    def serve(clear: bool) -> list:
+        cache = app.get_inference().cache
+
+        # Without the cached predictions every image is decoded and predicted
+        if clear:
+            cache.images.clear()
+            cache.features.clear()
+
+        latencies = [].copy()
+
+        for file in files:
+            time_start = time.perf_counter()
+            app.run(file)
+            latencies.append(time.perf_counter() - time_start)
+
+        return latencies
+
+    latencies = [].copy()
+    cached = [].copy()
+    rss = 0
+
+    for _ in range(repeats):
+        x, _, peak = measure(lambda: serve(True))
+        latencies.extend(x)
+        cached.extend(serve(False))
+        rss = max(rss, peak)
+
+    results["app_run"] = {"images": len(files), "first_call_seconds": first_seconds, "latency_ms": percentiles(latencies), "cached_latency_ms": percentiles(cached), "peak_rss_mib": rss}
+
+    return results
+
+def lookup(results: dict, key: str):
+    """
+    Get a nested value from a dotted key.
+
+    Parameters:
+    - results (dict): The results.
+    - key (str): The dotted key, e.g. "model_run.seconds".
+
+    Returns:
+    - The value, None if it does not exist.
+    """
+
+    for k in key.split("."):
+        if not isinstance(results, dict) or k not in results:
+            return None
+
+        results = results[k]
+
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compare the results against a baseline.
+
+    Parameters:
+    - results (dict): The current results.
+    - baseline (dict): The baseline results.
+    - threshold (float): Maximum relative degradation, e.g. 0.2 for 20 %.
+
+    Returns:
+    - list: The metrics that degraded more than the threshold.
+    """
+
+    regressions = [].copy()
+
+    for key, higher_is_better in METRICS.items():
+        current = lookup(results, key)
+        previous = lookup(baseline, key)
+
+        if current is None or previous is None or previous == 0:
+            continue
+
+        change = (current - previous) / previous
+
+        # Positive degradation means worse than the baseline
+        degradation = -change if higher_is_better else change
+        status = "REGRESSION" if degradation > threshold else "ok"
+
+        print(f"[BENCH] {key}: {current:.4f} vs {previous:.4f} ({change * 100:+.1f} %) {status}")
+
+        if degradation > threshold:
+            regressions.append(key)
+
+    return regressions
+
+def main() -> int:
+    """
+    Generate the synthetic dataset, run the benchmarks and compare them against the baseline.
+
+    Returns:
+    - int: The exit code, 1 if a metric regressed.
+    """
+
+    parser = argparse.ArgumentParser(description = "Benchmark the training and inference pipeline on a synthetic dataset")
+    parser.add_argument("--classes", type = int, default = 3, help = "Number of classes")
+    parser.add_argument("--images", type = int, default = 200, help = "Training images per class")
+    parser.add_argument("--test-images", type = int, default = 50, help = "Test images per class")
+    parser.add_argument("--width", type = int, default = 320, help = "Width of the generated images")
+    parser.add_argument("--height", type = int, default = 240, help = "Height of the generated images")
+    parser.add_argument("--seed", type = int, default = 0, help = "Seed of the generated images")
+    parser.add_argument("--repeats", type = int, default = 3, help = "Number of runs of the import and app.run phases")
+    parser.add_argument("--output", default = "benchmarks/results.json", help = "File where the results are saved")
+    parser.add_argument("--baseline", default = "benchmarks/baseline.json", help = "Baseline the results are compared against")
+    parser.add_argument("--threshold", type = float, default = 0.2, help = "Maximum relative degradation before failing")
+    parser.add_argument("--save-baseline", action = "store_true", help = "Save the results as the new baseline")
+    args = parser.parse_args()
+
+    classes = [f"class{x}" for x in range(args.classes)]
+    path = tempfile.mkdtemp(prefix = "ceres-bench-")
+
+    try:
+        print(f"[BENCH] Generating {args.images} training and {args.test_images} test images of {args.width}x{args.height} for {len(classes)} classes in {path}")
+
+        generate_dataset(os.path.join(path, "processed"), classes, args.images, args.test_images, (args.width, args.height), args.seed)
+
+        results = {
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+            "dataset": {"classes": len(classes), "images": args.images, "test_images": args.test_images, "size": [args.width, args.height], "seed": args.seed},
+            "results": run(path, classes, args.repeats)
+        }
+
+    finally:
+        default_loader().close()
+        shutil.rmtree(path, ignore_errors = True)
+
+    for phase, values in results["results"].items():
+        print(f"[BENCH] {phase}: {json.dumps(values)}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent = 4)
+
+    print(f"[BENCH] Results saved to {args.output}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+
+        print(f"[BENCH] Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"[BENCH] No baseline found at {args.baseline}, run with --save-baseline to create it")
+        return 0
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    if baseline["dataset"] != results["dataset"]:
+        print("[ERROR] The baseline was measured on a different dataset, not comparing")
+        return 1
+
+    regressions = compare(results["results"], baseline["results"], args.threshold)
+
+    if len(regressions) > 0:
+        print(f"[ERROR] {len(regressions)} metrics regressed more than {args.threshold * 100:.0f} %: {', '.join(regressions)}")
+        return 1
+
+    print("[BENCH] No regressions")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,8 @@ dataset = {
     "path_raw": "raw",
     "path_processed": "processed",
     "path_fastdup": "fastdup",
+    "path_features": "features",
+    "path_manifest": "manifest.json",
     "path_training": "train",
     "path_test": "test",
     "classes": ["macarrones", "pizza", "tiramisu"],
@@ -186,7 +188,22 @@ dataset = {
     "classes_images_split_ratio": 0.80,
     "fastdup": {
         "export": True,
-        "amount_of_runs": 3
+        "amount_of_runs": 3,
+        "workers": None
+    },
+    "validation": {
+        "min_size": [50, 50],
+        "channels": [1, 3],
+        "workers": None,
+        "path": "validation.json"
+    },
+    "dedupe": "fastdup",
+    "perceptual_hash": {
+        "method": "dhash",
+        "distance": 4,
+        "workers": None,
+        "path": "perceptual_hash.json",
+        "sample": 200
     }
 }
 
@@ -196,8 +213,56 @@ model = {
     "path_models": "models",
     "path_classes": "./data/processed",
     "name": "svc_model.joblib",
+    "compact": False,
+    "compact_name": "svc_model.bin",
+    "reload_interval": 5,
+    "fused": True,
+    "parallel": True,
+    "parallel_workers": None,
+    "memory_budget": None,
+    "memory_fallback": False,
+    "incremental": False,
+    "engine": "svc",
+    "approx": {
+        "method": "nystroem",
+        "n_components": 1000,
+        "gamma": None,
+        "alpha": 1e-4,
+        "batch_size": 1024,
+        "epochs": 5,
+        "warm_epochs": 1
+    },
+    "features": {
+        "method": None,
+        "n_components": 100,
+        "whiten": True
+    },
+    "search": {
+        "method": None,
+        "path": "search",
+        "min_samples": 100,
+        "factor": 3,
+        "cv": 3
+    },
     "grid_search": {
         "C": [4, 5, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100],
         "kernel": ["rbf", "linear", "poly"]
     }
 }
+
+# Server configuration
+server = {
+    "warm_up": True,
+    "ready_file": "/tmp/ceres.ready",
+    "metrics": True,
+    "metrics_port": 9090,
+    "batch_size": 32,
+    "batch_delay": 0.005,
+    "cache_size": 4096,
+    "cache_ttl": 3600,
+    "api_port": 8000,
+    "api_workers": 4,
+    "api_keep_alive": 5,
+    "api_max_body": 10 * 1024 * 1024,
+    "api_max_files": 64
+}
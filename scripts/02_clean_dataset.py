@@ -4,158 +4,354 @@ sys.path.insert(0, 'config')
 sys.path.insert(0, 'utils')
 
 import os
+import time
 import config
 import random
-import shutil
 import fastdup
-from utils import create_path, delete_path, copy_path, delete_files
+import concurrent.futures
+import pandas as pd
+from utils import create_path, delete_path
+from perceptual_hash import BKTree, HashIndex, hamming
+from image_validation import VerdictCache
+from dataset_manifest import scan_dataset, kept, remove, load_manifest, save_manifest, materialise
+
+def split_bucket(digest: str) -> float:
+    """
+    Map a content hash to a stable position in [0, 1).
+
+    Parameters:
+    - digest (str): The hexadecimal content hash.
+
+    Returns:
+    - float: The position, uniformly distributed over the images.
+    """
+
+    return int(digest[:8], 16) / 0x100000000
 
-def separate_files() -> None:
+def separate_files(records: list) -> None:
     """
-    Separates files into training and test sets for each class in the dataset.
+    Assign the kept records of each class to the training or the test set from their content hash.
+
+    The split of an image only depends on its content, so every clean produces the same split and adding
+    images never moves the existing ones between the training and the test sets.
+
+    Parameters:
+    - records (list): The manifest records, annotated in place.
     """
 
     for class_name in config.dataset["classes"]:
-        # Prepare folders
-        delete_path(os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name, config.dataset["path_training"]), True)
-        delete_path(os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name, config.dataset["path_test"]), True)
-        
-        create_path(os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name, config.dataset["path_training"]))
-        create_path(os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name, config.dataset["path_test"]))
-
-        all_files = os.listdir(os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name))
-        
-        random.shuffle(all_files)
-
-        # Divide the files into two lists based on the split index
-        split_index = int(len(all_files) * config.dataset["classes_images_split_ratio"])
-        
-        files_folder1 = all_files[:split_index]
-        files_folder2 = all_files[split_index:]
-
-        # Move files to the respective output folders
-        input_folder = os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name)
-        output_folder_training = os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name, config.dataset["path_training"])
-        output_folder_test = os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name, config.dataset["path_test"])
-
-        for file in files_folder1:
-            if os.path.isfile(os.path.join(input_folder, file)):
-                source_path = os.path.join(input_folder, file)
-                destination_path = os.path.join(output_folder_training, file)
-                
-                shutil.move(source_path, destination_path)
-
-        for file in files_folder2:
-            if os.path.isfile(os.path.join(input_folder, file)):
-                source_path = os.path.join(input_folder, file)
-                destination_path = os.path.join(output_folder_test, file)
-
-                shutil.move(source_path, destination_path)
-
-def _fastdup() -> None:
+        class_records = kept(records, class_name)
+
+        for r in class_records:
+            r["split"] = config.dataset["path_training"] if split_bucket(r["hash"]) < config.dataset["classes_images_split_ratio"] else config.dataset["path_test"]
+
+        training = sum(r["split"] == config.dataset["path_training"] for r in class_records)
+
+        print(f"[INFO] Split for {class_name}: {training} training and {len(class_records) - training} test images")
+
+def _fastdup_class(class_name: str, filenames: list[str], input_dir: str, work_dir: str, max_runs: int, export: bool, num_threads: int, similarity: bool) -> dict:
+    """
+    Run Fastdup on the images of one class until a run removes nothing, in a worker process.
+
+    Parameters:
+    - class_name (str): The class name.
+    - filenames (list[str]): The absolute paths of the images of the class.
+    - input_dir (str): The raw folder of the class.
+    - work_dir (str): The Fastdup working directory of the class.
+    - max_runs (int): Maximum number of runs.
+    - export (bool): Whether the duplicates and outliers galleries are exported.
+    - num_threads (int): Number of threads of Fastdup, so the parallel classes do not oversubscribe the CPUs.
+    - similarity (bool): Whether to collect the pairs of duplicate images.
+
+    Returns:
+    - dict: The invalid and outlier filenames removed, the duplicate pairs found, the number of runs and the seconds taken.
+    """
+
+    time_start = time.time()
+    remaining = set(filenames)
+    invalid = [].copy()
+    outliers = [].copy()
+    similar = set()
+    runs = 0
+
+    create_path(work_dir)
+
+    while runs < max_runs and len(remaining) > 0:
+        runs += 1
+
+        # Instantiate a Fastdup object
+        fd = fastdup.create(work_dir=work_dir, input_dir=input_dir)
+
+        # Run Fastdup on the images kept by the previous runs
+        fd.run(annotations = pd.DataFrame({"filename": sorted(remaining), "label": class_name}), data_type = "image", overwrite = True, threshold = 0.98, num_threads = num_threads, verbose = False)
+
+        # If the 'export' flag is set
+        if export == True:
+            fd.vis.duplicates_gallery()
+            fd.vis.outliers_gallery()
+
+        # Pairs of images over the similarity threshold
+        if similarity:
+            pairs = fd.similarity()
+            pairs = pairs[pairs["distance"] >= 0.98]
+            similar.update(tuple(sorted(os.path.abspath(os.path.join(input_dir, x)) for x in pair)) for pair in zip(pairs["filename_from"], pairs["filename_to"]))
+
+        # Invalid instances and outliers detected by Fastdup
+        run_invalid = {os.path.abspath(os.path.join(input_dir, x)) for x in fd.invalid_instances()["filename"].to_list()} & remaining
+        remaining -= run_invalid
+        run_outliers = {os.path.abspath(os.path.join(input_dir, x)) for x in fd.outliers()["filename_outlier"].to_list()} & remaining
+        remaining -= run_outliers
+
+        invalid.extend(sorted(run_invalid))
+        outliers.extend(sorted(run_outliers))
+
+        # A run that removes nothing would give the same result again
+        if len(run_invalid) + len(run_outliers) == 0:
+            break
+
+    return {"invalid": invalid, "outliers": outliers, "similar": sorted(similar), "runs": runs, "seconds": time.time() - time_start}
+
+def _fastdup(records: list, similarity: bool = False) -> set:
     """
     Encapsulates the main logic for processing datasets using Fastdup.
 
-    This function initiates the Fastdup workflow, including initializing the Fastdup object, running the analysis, handling output galleries, and removing invalid and outlier instances.
+    Every class is analysed in its own worker process and working directory. A class is run again on the
+    images it kept until a run removes nothing, up to the configured amount of runs. The invalid instances
+    and outliers found are removed from the manifest.
+
+    Parameters:
+    - records (list): The manifest records, annotated in place.
+    - similarity (bool): Whether to collect the pairs of duplicate images, only needed to compare them with the perceptual hash.
+
+    Returns:
+    - set: The pairs (sorted absolute paths) of images Fastdup considers duplicates, empty without similarity.
     """
 
     # Prepare folders
     delete_path(os.path.join(config.dataset["path"], config.dataset["path_fastdup"]), True)
 
-    for num_run in range(config.dataset["fastdup"]["amount_of_runs"]):
-        print("[INFO] Number of runs: " + str(num_run + 1))
-        
-        for class_name in config.dataset["classes"]:
-            print(f"[INFO] Fastdup running for {class_name}")
+    classes = [c for c in config.dataset["classes"] if len(kept(records, c)) > 0]
+    similar = set()
+
+    if len(classes) == 0:
+        return similar
+
+    workers = min(len(classes), config.dataset["fastdup"]["workers"] or len(classes), os.cpu_count())
+
+    print(f"[INFO] Fastdup running for {len(classes)} classes with {workers} workers")
+
+    time_start = time.time()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+        futures = {}
+
+        for class_name in classes:
+            # Only the records kept so far are analysed, the raw images are never modified
+            by_filename = {os.path.abspath(r["path"]): r for r in kept(records, class_name)}
+
+            future = executor.submit(
+                _fastdup_class,
+                class_name,
+                list(by_filename.keys()),
+                os.path.abspath(os.path.join(config.dataset["path"], config.dataset["path_raw"], class_name)),
+                os.path.join(config.dataset["path"], config.dataset["path_fastdup"], class_name),
+                config.dataset["fastdup"]["amount_of_runs"],
+                config.dataset["fastdup"]["export"],
+                max(1, os.cpu_count() // workers),
+                similarity
+            )
+
+            futures[future] = (class_name, by_filename)
+
+        for future in concurrent.futures.as_completed(futures):
+            class_name, by_filename = futures[future]
+            result = future.result()
+
+            invalid = remove([by_filename[x] for x in result["invalid"]], "fastdup_invalid")
+            outliers = remove([by_filename[x] for x in result["outliers"]], "fastdup_outlier")
+            similar.update(tuple(x) for x in result["similar"])
+
+            print(f"[INFO] Fastdup running for {class_name} has successfully finished in {result['seconds']} seconds ({result['runs']} runs, {invalid} invalid, {outliers} outliers)")
 
-            # Get the paths to the processed class data and the Fastdup working directory
-            dir = os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name)
-            work_dir = os.path.join(config.dataset["path"], config.dataset["path_fastdup"], class_name)
+    print(f"[INFO] Fastdup has successfully finished in {time.time() - time_start} seconds")
 
-            create_path(work_dir)
+    return similar
 
-            # Instantiate a Fastdup object
-            fd = fastdup.create(work_dir=work_dir, input_dir=dir)
+def _agreement(records: list, duplicates: list, similar: set, hashes: dict) -> None:
+    """
+    Report how the perceptual hash duplicates agree with the Fastdup duplicates (threshold 0.98) on a sample.
+
+    Parameters:
+    - records (list): The manifest records.
+    - duplicates (list): The (duplicate, original, distance) perceptual hash matches.
+    - similar (set): The pairs (sorted absolute paths) of images Fastdup considers duplicates.
+    - hashes (dict): The perceptual hashes by content hash.
+    """
+
+    settings = config.dataset["perceptual_hash"]
+    rng = random.Random(0)
+
+    # A removal agrees when Fastdup also found the removed image similar to another image
+    paired = {x for pair in similar for x in pair}
+    sample = rng.sample(duplicates, min(settings["sample"], len(duplicates)))
+    agree = [d for d, _, _ in sample if os.path.abspath(d["path"]) in paired]
 
-            # Run Fastdup on the image data
-            fd.run(data_type = "image", overwrite = True, threshold = 0.98, verbose = False)
+    print(f"[INFO] {len(agree)} of {len(sample)} sampled perceptual hash removals are also Fastdup duplicates")
 
-            # If the 'export' flag is set
-            if config.dataset["fastdup"]["export"] == True:
-                fd.vis.duplicates_gallery()
-                fd.vis.outliers_gallery()
+    for d, o, distance in sample:
+        if os.path.abspath(d["path"]) not in paired:
+            print(f"[INFO] Only the perceptual hash considers {d['path']} a duplicate of {o['path']} (distance {distance})")
 
-            # Remove invalid instances and outliers detected by Fastdup
-            delete_files(fd.invalid_instances()["filename"].to_list())
-            delete_files(fd.outliers()["filename_outlier"].to_list())
+    # And the other way round, the Fastdup pairs within the Hamming distance
+    by_path = {os.path.abspath(r["path"]): hashes.get(r["hash"]) for r in records}
+    sample = rng.sample(sorted(similar), min(settings["sample"], len(similar)))
+    found = [(a, b) for a, b in sample if by_path.get(a) is not None and by_path.get(b) is not None and hamming(by_path[a], by_path[b]) <= settings["distance"]]
 
-            print(f"[INFO] Fastdup running for {class_name} has successfully finished")
+    print(f"[INFO] {len(found)} of {len(sample)} sampled Fastdup duplicates are also perceptual hash duplicates")
 
-def rename_files() -> None:
+def _perceptual_hash(records: list, similar: set = None) -> None:
     """
-    Rename image files in the processed folder for each class.
+    Remove the near-duplicate images of each class using their perceptual hashes.
 
-    This function iterates through each class in the dataset, renames the image files,
-    and prints information about the process.
+    The hashes are computed in a pool of worker processes and kept in a persistent index by content hash,
+    so only new images are hashed again. Every class is searched with a BK-tree, the images already in the
+    index first, so a new image is removed when it duplicates an existing one and never the other way round.
+
+    Parameters:
+    - records (list): The manifest records, annotated in place.
+    - similar (set): The Fastdup duplicate pairs the removals are compared against, None to skip the comparison.
     """
+
+    settings = config.dataset["perceptual_hash"]
+    time_start = time.time()
+
+    index = HashIndex(os.path.join(config.dataset["path"], settings["path"]), settings["method"])
+    known = set(index.values.keys())
+
+    count = index.update({r["hash"]: r["path"] for r in kept(records)}, settings["workers"])
+    index.save()
+
+    duplicates = [].copy()
+
     for class_name in config.dataset["classes"]:
-        print(f"[INFO] Renaming images for {class_name}")
+        tree = BKTree()
+
+        # The sort is stable, so the images keep the manifest order within each group
+        for r in sorted(kept(records, class_name), key = lambda r: r["hash"] not in known):
+            value = index.values[r["hash"]]
+
+            if value is None:
+                continue
+
+            matches = tree.search(value, settings["distance"])
+
+            if len(matches) > 0:
+                duplicates.append((r, matches[0][1], matches[0][0]))
+                continue
 
-        counter = 0
-        for file in os.listdir(os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name)):
-            filename = f"{class_name}_{counter}.{config.dataset['classes_images_extension']}"
-            original_filename = os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name, file)
+            tree.add(value, r)
 
-            os.rename(original_filename, os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name, filename))
-            counter += 1
+    if similar is not None:
+        _agreement(records, duplicates, similar, index.values)
 
-        print(f"[INFO] Renaming images for {class_name} has successfully finished")
+    removed = remove([d for d, _, _ in duplicates], "perceptual_duplicate")
 
-def remove_wrong_extensions() -> None:
+    print(f"[INFO] Perceptual hash deduplication has successfully finished in {time.time() - time_start} seconds ({count} images hashed, {removed} duplicates)")
+
+def rename_files(records: list) -> None:
     """
-    Remove images with the wrong extension for each class.
+    Assign the processed file name of the kept records of each class from their content hash.
+
+    The names do not depend on the other images, so the cached features of an image stay valid when images are added.
 
-    This function iterates through each class in the dataset, removes images with
-    the wrong extension, and prints information about the process.
+    Parameters:
+    - records (list): The manifest records, annotated in place.
     """
     for class_name in config.dataset["classes"]:
-        print(f"[INFO] Removing images with the wrong extension for {class_name}")
+        names = set()
 
-        # Iterate through and remove images with the wrong extension
-        for file in os.listdir(os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name)):
-            if not file.endswith(config.dataset["classes_images_extension"]):
-                os.remove(os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name, file))
+        for r in kept(records, class_name):
+            name = f"{class_name}_{r['hash'][:16]}"
+            counter = 1
 
-        print(f"[INFO] Removing images with the wrong extension for {class_name} has successfully finished")
+            # Identical files kept in the same class
+            while name in names:
+                name = f"{class_name}_{r['hash'][:16]}_{counter}"
+                counter += 1
 
-def copy_data() -> None:
+            names.add(name)
+            r["name"] = f"{name}.{config.dataset['classes_images_extension']}"
+
+def remove_wrong_extensions(records: list) -> None:
     """
-    Copy data from the raw folder to the processed folder for each class.
+    Remove the records of images with the wrong extension.
 
-    This function prepares folders, then iterates through each class in the dataset,
-    creates paths, and copies data from the raw folder to the processed folder.
+    Parameters:
+    - records (list): The manifest records, annotated in place.
     """
-    # Prepare folders
-    delete_path(os.path.join(config.dataset["path"], config.dataset["path_processed"]), True)
-    create_path(os.path.join(config.dataset["path"], config.dataset["path_processed"]))
+    count = remove([r for r in kept(records) if r["ext"] != config.dataset["classes_images_extension"]], "extension")
 
-    # Copy the data
-    for class_name in config.dataset["classes"]:
-        create_path(os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name))
-        copy_path(os.path.join(config.dataset["path"], config.dataset["path_raw"], class_name), os.path.join(config.dataset["path"], config.dataset["path_processed"], class_name))
+    print(f"[INFO] Removed {count} images with the wrong extension")
+
+def validate_images(records: list) -> None:
+    """
+    Remove the records of truncated, undecodable, too small or wrongly coloured images.
+
+    The images are decoded in a pool of worker processes and every verdict is cached by content hash,
+    so the images validated by a previous run are not decoded again.
+
+    Parameters:
+    - records (list): The manifest records, annotated in place.
+    """
+
+    settings = config.dataset["validation"]
+    time_start = time.time()
+
+    cache = VerdictCache(os.path.join(config.dataset["path"], settings["path"]), settings["min_size"], settings["channels"])
+    count = cache.update({r["hash"]: r["path"] for r in kept(records)}, settings["workers"])
+    cache.save()
+
+    reasons = {}
+
+    for r in kept(records):
+        verdict = cache.values[r["hash"]]
+
+        if not verdict["valid"]:
+            remove([r], f"invalid_{verdict['reason']}")
+            reasons[verdict["reason"]] = reasons.get(verdict["reason"], 0) + 1
+
+    print(f"[INFO] Validating images has successfully finished in {time.time() - time_start} seconds ({count} images decoded, {sum(reasons.values())} invalid: {reasons})")
 
 def clean() -> None:
     """
     Perform the cleaning process.
 
-    This function calls the necessary functions to clean the dataset, including
-    copying data, removing images with the wrong extension, and renaming files.
+    The raw folder is listed once into a manifest of records (path, size, extension, hash, class, split).
+    Every stage only filters or annotates the manifest, and the processed folder is built once at the end
+    by linking the kept raw images to their class, split and name. The manifest, with the reason every
+    removed image was discarded, is saved next to the processed folder.
     """
-    copy_data()
-    remove_wrong_extensions()
-    rename_files()
-    _fastdup()
-    separate_files()
+    manifest_path = os.path.join(config.dataset["path"], config.dataset["path_manifest"])
+
+    records = scan_dataset(os.path.join(config.dataset["path"], config.dataset["path_raw"]), config.dataset["classes"], load_manifest(manifest_path))
+
+    remove_wrong_extensions(records)
+    validate_images(records)
+
+    # Fastdup, the perceptual hash or both, the latter comparing their results
+    dedupe = config.dataset["dedupe"]
+    similar = _fastdup(records, dedupe == "both") if dedupe in ("fastdup", "both") else None
+
+    if dedupe in ("phash", "both"):
+        _perceptual_hash(records, similar)
+
+    rename_files(records)
+    separate_files(records)
+
+    materialise(records, os.path.join(config.dataset["path"], config.dataset["path_processed"]), config.dataset["classes"], [config.dataset["path_training"], config.dataset["path_test"]])
+    save_manifest(manifest_path, records)
+
+    print(f"[INFO] Cleaning has successfully finished, {len(kept(records))} of {len(records)} images kept")
 
 if __name__ == "__main__":
     clean()
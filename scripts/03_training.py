@@ -4,46 +4,31 @@ sys.path.insert(0, 'config')
 sys.path.insert(0, 'utils')
 
 import os
+import json
 import time
+import hashlib
 import config
 import joblib
-import cv2 as cv
 import numpy as np
-import concurrent.futures
 from sklearn.svm import SVC
 from utils import create_path, delete_path
+from compact_model import export_model
+from feature_store import FeatureStore
+from shm_loader import IMAGE_LENGTH, compact_rows, default_loader
+from parallel_training import fit_parallel
+from approx_model import ApproxKernelClassifier
+from hyperparameter_search import data_signature, successive_halving
+from memory_usage import memory_phase, chunk_rows
+from feature_stage import FEATURE_STAGE_NAME, FeatureStage, save_stage
 from sklearn.model_selection import GridSearchCV
+from sklearn.metrics import confusion_matrix, precision_recall_fscore_support, roc_auc_score
 
-def import_images_thread(path: str, label: str, files: list[str]) -> list:
-    """
-        Import images from a specified path and assign labels (using a Thread).
-
-        Parameters:
-        - path (str): The path to the images.
-        - label (str): The label assigned to the images.
-        - files (list[str]): The list of files.
-
-        Returns:
-        - list: List containing images and labels.
-    """
-
-    images = [].copy()
-    labels = [].copy()
-
-    for file in files:
-        # Make sure we just use images
-        if os.path.isfile(os.path.join(path, file)):
-            img = cv.imread(os.path.join(path, file))
-            img = cv.resize(img, (50, 50))
-
-            images.append(img.flatten())
-            labels.append(label)
-
-    return images, labels
+# Files of the models directory removed when they do not belong to the published models
+MODEL_FILES = (".joblib", ".bin", ".state.json", ".report.json")
 
 class Algorithm(object):
     
-    def __init__(self, *, base_path: str, model_path: str = "models",  model_name: str = "svc_model.joblib", model_grid_search: dict, classes: list[str], classes_other: list[str], classes_path: str, classes_path_training: str, classes_path_test: str) -> None:
+    def __init__(self, *, base_path: str, model_path: str = "models",  model_name: str = "svc_model.joblib", model_compact_name: str = None, model_engine: str = "svc", model_approx: dict = None, model_search: dict = None, model_grid_search: dict, classes: list[str], classes_other: list[str], classes_path: str, classes_path_training: str, classes_path_test: str, feature_store: FeatureStore = None, feature_stage: FeatureStage = None, memory_budget: int = None, memory_fallback: bool = False, incremental: bool = False) -> None:
         """
         Initialize the Algorithm class.
 
@@ -51,25 +36,51 @@ class Algorithm(object):
         - base_path (str): The base path for the model and dataset.
         - model_path (str): The path where the model will be saved.
         - model_name (str): The name of the model file.
+        - model_compact_name (str): The name of the compact model file, None to not export it.
+        - model_engine (str): The training engine, "svc" for the exact kernel SVC or "approx" for the kernel approximation trained on minibatches.
+        - model_approx (dict): The parameters of the ApproxKernelClassifier used by the "approx" engine.
+        - model_search (dict): The hyperparameter search settings (method "halving" or "grid", results path, min_samples, factor, cv).
         - model_grid_search (dict): The dictionary of the GridSearchCV
         - classes (list): List of class names to classify.
         - classes_other (list): List of class names that must not be classified.
         - classes_path (str): The path to the processed dataset.
         - classes_path_training (str): The subpath for the training data.
         - classes_path_test (str): The subpath for the test data.
+        - feature_store (FeatureStore): Store of decoded images shared by every instance, None to decode them every time.
+        - feature_stage (FeatureStage): Fitted feature stage applied to every imported image, None to use raw pixels.
+        - memory_budget (int): Memory in bytes the training and the tests may use before processing the images in chunks, None for no limit.
+        - memory_fallback (bool): Whether the "svc" engine falls back to the "approx" engine when training does not fit in the memory budget, instead of failing.
+        - incremental (bool): Whether to continue from the saved model when only the training images changed and the engine supports it.
         """
 
         self.base_path = base_path
         self.classes = classes
         self.classes_other = classes_other
         self.model_name = model_name
+        self.model_compact_name = model_compact_name
+        self.model_engine = model_engine
+        self.model_search = model_search or {"method": "grid"}
         self.model_path = model_path
         self.model_grid_search  = model_grid_search
         self.classes_path = classes_path
         self.classes_path_training = classes_path_training
         self.classes_path_test = classes_path_test
-
-        self.model = SVC(C = 5, kernel = "rbf", probability = True)
+        self.feature_store = feature_store
+        self.feature_stage = feature_stage
+        self.memory_budget = memory_budget
+        self.memory_fallback = memory_fallback
+        self.incremental = incremental
+        self.model_approx = model_approx or {}
+
+        if model_engine == "approx":
+            self.model = ApproxKernelClassifier(**self.model_approx)
+        else:
+            self.model = SVC(C = 5, kernel = "rbf", probability = True)
+
+        # The engine the model was actually trained with, and the configured model replaced by the memory fallback
+        self.trained_engine = model_engine
+        self.configured_model = None
+        self.compact_exported = False
 
         # Initialize lists to store training and test data
         self.training_labels = [].copy()
@@ -77,7 +88,7 @@ class Algorithm(object):
         self.test_labels = [].copy()
         self.test_images = [].copy()
     
-    def import_images(self, *, path: str = None, label: str = "other") -> list:
+    def import_images(self, *, path: str = None, label: str = "other") -> tuple:
         """
         Import images from a specified path and assign labels.
 
@@ -86,110 +97,456 @@ class Algorithm(object):
         - label (str): The label assigned to the images.
 
         Returns:
-        - list: List containing images and labels.
+        - tuple: The matrix with one image (or feature vector) per row and the label of every row, both empty if the path does not exist.
         """
 
-        images = [].copy()
-        labels = [].copy()
-        threads = [].copy()
+        # Check if path is none or does not exist
+        if path is None or not os.path.exists(path):
+            print(f"[INFO] Path {path} does not exist, no images for label {label}")
 
-        # Check if path is none
-        if path is None:
-            print("[INFO] Path not specified")
-            return []
+            images = np.empty((0, IMAGE_LENGTH), dtype = np.uint8)
 
-        # Check if path exists
-        if not os.path.exists(path):
-            print("[INFO] Path does not exist")
-            return []
+            return (self.feature_stage.transform(images) if self.feature_stage is not None else images), []
 
         print(f"[INFO] Importing images for label {label}")
 
-        files = os.listdir(path)
         time_start = time.time()
 
-        # Import images from filesystem using multiple threads
-        with concurrent.futures.ProcessPoolExecutor() as executor:
+        # Reuse the images decoded by a previous run or by another instance
+        if self.feature_store is not None:
+            data, _ = self.feature_store.load(path = path, name = os.path.relpath(path, self.classes_path).replace(os.sep, "_"))
 
-            # Creates threads to import images (5 images per thread)
-            while len(files) > 0:
-                threads.append(executor.submit(import_images_thread, path, label, files[: 5]))
+            images = data.reshape(len(data), IMAGE_LENGTH)
+            labels = [label] * len(images)
 
-                files = files[5: ]
-            
-            concurrent.futures.wait(threads)
+            if self.feature_stage is not None:
+                images = self.feature_stage.transform(images)
 
-            # Combine the images and their labels
-            for t in threads:
-                images_tmp, labels_tmp = t.result()
+            print(f"[INFO] Importing images for label {label} has successfully finished in {time.time() - time_start} seconds")
+
+            return images, labels
+
+        # Make sure we just use images
+        files = [os.path.join(path, file) for file in os.listdir(path) if os.path.isfile(os.path.join(path, file))]
+
+        # Import images from filesystem using the shared pool of processes, straight into the matrix
+        images = np.empty((len(files), IMAGE_LENGTH), dtype = np.uint8)
+        _, decoded = default_loader().load(files, out = images)
+
+        if not decoded.all():
+            print(f"[ERROR] Unable to decode {len(decoded) - decoded.sum()} images for label {label}")
+
+        images = images[: compact_rows(images, decoded)]
+        labels = [label] * len(images)
+
+        # Same features as app.py computes before predicting
+        if self.feature_stage is not None:
+            images = self.feature_stage.transform(images)
 
-                images.extend(images_tmp)
-                labels.extend(labels_tmp)        
-        
         print(f"[INFO] Importing images for label {label} has successfully finished in {time.time() - time_start} seconds")
         
         return images, labels
 
-    def model_best_parameters(self) -> None:
+    def import_matrix(self, *, split: str) -> tuple:
         """
-        Find the best parameters using GridSearchCV.
+        Import the images of every class into a single preallocated matrix, labelling the other classes as "other".
+
+        Parameters:
+        - split (str): The subpath of the split (training or test).
+
+        Returns:
+        - tuple: The matrix with one flattened uint8 image (or float32 feature vector) per row and the label of every row.
         """
 
-        for class_name in self.classes:
-            images, labels = self.import_images(path = os.path.join(self.classes_path, class_name, self.classes_path_training), label = class_name)
+        # Without feature store nor feature stage every image is decoded straight into its row of the matrix
+        if self.feature_store is None and self.feature_stage is None:
+            return self.import_matrix_files(split = split)
 
-            self.training_images.extend(images)
-            self.training_labels.extend(labels)
+        parts = [].copy()
 
-        print("[INFO] Running GridSearch")
+        # With the feature store the parts are memory-mapped, so only the final matrix is allocated
+        for class_name in self.classes + self.classes_other:
+            images, _ = self.import_images(path = os.path.join(self.classes_path, class_name, split), label = class_name)
 
-        time_start = time.time()
+            if len(images) > 0:
+                parts.append((images, class_name if class_name in self.classes else "other"))
 
-        # Instantiate the GridSearchCV object
-        grid_search = GridSearchCV(self.model, self.model_grid_search, scoring = 'accuracy', n_jobs = -1)
-        grid_search.fit(self.training_images, self.training_labels)
-        
-        print(f"[INFO] Results: {grid_search.best_params_}")
+        length = parts[0][0].shape[1] if len(parts) > 0 else IMAGE_LENGTH
+        dtype = parts[0][0].dtype if len(parts) > 0 else np.uint8
+
+        matrix = np.empty((sum(len(x) for x, _ in parts), length), dtype = dtype)
+        labels = np.empty(len(matrix), dtype = object)
+        offset = 0
 
-        print(f"[INFO] Running GridSearch has successfully finished in {time.time() - time_start} seconds")
+        for images, label in parts:
+            matrix[offset: offset + len(images)] = images
+            labels[offset: offset + len(images)] = label
+            offset += len(images)
 
-    def model_test(self) -> None:
+        return matrix, labels.astype(str)
+
+    def import_matrix_files(self, *, split: str) -> tuple:
         """
-        Test the trained model on the test dataset.
+        Decode the images of every class directly into a single preallocated matrix, labelling the other classes as "other".
+
+        Parameters:
+        - split (str): The subpath of the split (training or test).
+
+        Returns:
+        - tuple: The matrix with one flattened uint8 image per row and the label of every row.
+        """
+
+        parts = [].copy()
+
+        for class_name in self.classes + self.classes_other:
+            path = os.path.join(self.classes_path, class_name, split)
+
+            if not os.path.exists(path):
+                print(f"[INFO] Path {path} does not exist, no images for label {class_name}")
+                continue
+
+            files = [os.path.join(path, file) for file in os.listdir(path) if os.path.isfile(os.path.join(path, file))]
+            parts.append((files, class_name))
+
+        matrix = np.empty((sum(len(x) for x, _ in parts), IMAGE_LENGTH), dtype = np.uint8)
+        labels = np.empty(len(matrix), dtype = object)
+        decoded = np.zeros(len(matrix), dtype = bool)
+        offset = 0
+
+        for files, class_name in parts:
+            print(f"[INFO] Importing images for label {class_name}")
+
+            time_start = time.time()
+
+            _, decoded[offset: offset + len(files)] = default_loader().load(files, out = matrix[offset: offset + len(files)])
+
+            if not decoded[offset: offset + len(files)].all():
+                print(f"[ERROR] Unable to decode {len(files) - decoded[offset: offset + len(files)].sum()} images for label {class_name}")
+
+            labels[offset: offset + len(files)] = class_name if class_name in self.classes else "other"
+            offset += len(files)
+
+            print(f"[INFO] Importing images for label {class_name} has successfully finished in {time.time() - time_start} seconds")
+
+        # Drop the rows of the images that can not be decoded without copying the matrix
+        matrix = matrix[: compact_rows(matrix, decoded)]
+
+        return matrix, labels[decoded].astype(str)
+
+    def model_best_parameters(self) -> dict:
+        """
+        Find the best parameters and apply them to the model, reusing the saved results if the images and the grid did not change.
+
+        Returns:
+        - dict: The best parameters.
+        """
+
+        if self.model_engine != "svc":
+            print(f"[INFO] Hyperparameter search is not supported by the {self.model_engine} engine")
+            return {}
+
+        images, labels = self.import_matrix(split = self.classes_path_training)
+
+        signature = json.loads(json.dumps({"data": data_signature(images, labels), "grid": self.model_grid_search, "search": self.model_search}))
+
+        results_path = os.path.join(self.base_path, self.model_search.get("path", "search"), os.path.splitext(self.model_name)[0] + ".search.json")
+        results = None
+
+        if os.path.exists(results_path):
+            with open(results_path, "r") as f:
+                results = json.load(f)
+
+        if results is not None and results["signature"] == signature:
+            print(f"[INFO] Reusing the hyperparameter search results of {results_path}")
+        else:
+            time_start = time.time()
+
+            if self.model_search["method"] == "halving":
+                print("[INFO] Running successive halving")
+
+                results = successive_halving(
+                    images, labels, self.model_grid_search,
+                    min_samples = self.model_search.get("min_samples", 100),
+                    factor = self.model_search.get("factor", 3),
+                    cv = self.model_search.get("cv", 3)
+                )
+            else:
+                print("[INFO] Running GridSearch")
+
+                # Instantiate the GridSearchCV object
+                grid_search = GridSearchCV(self.model, self.model_grid_search, scoring = 'accuracy', cv = self.model_search.get("cv", 5), n_jobs = -1)
+                grid_search.fit(images, labels)
+
+                results = {
+                    "best_params": grid_search.best_params_,
+                    "best_score": float(grid_search.best_score_),
+                    "seconds": time.time() - time_start,
+                    "candidates": [{"params": p, "score": float(score), "seconds": float(seconds)} for p, score, seconds in zip(grid_search.cv_results_["params"], grid_search.cv_results_["mean_test_score"], grid_search.cv_results_["mean_fit_time"])]
+                }
+
+            print(f"[INFO] Running the hyperparameter search has successfully finished in {time.time() - time_start} seconds")
+
+            results["signature"] = signature
+
+            create_path(os.path.dirname(results_path))
+
+            with open(results_path + ".tmp", "w") as f:
+                json.dump(results, f, indent = 4)
+
+            os.replace(results_path + ".tmp", results_path)
+
+        print(f"[INFO] Results: {results['best_params']} (score {results['best_score']})")
+
+        self.model.set_params(**results["best_params"])
+
+        return results["best_params"]
+
+    def model_test(self, latency_samples: int = 200) -> dict:
+        """
+        Test the trained model on the test dataset and save a JSON report next to the model.
+
+        Parameters:
+        - latency_samples (int): Number of test images predicted one by one to measure the latency.
+
+        Returns:
+        - dict: The report with the quality and speed metrics.
         """
 
         print("[INFO] Starting model tests")
 
+        with memory_phase("test import"):
+            images, labels = self.import_matrix(split = self.classes_path_test)
+
+        # Predict the test matrix in as few batches as the memory budget allows, the models work on float64 copies
+        chunk = chunk_rows(images.shape[1] * 8, self.memory_budget, len(images))
+
+        predictions = [].copy()
+        probabilities = [].copy()
+
+        time_start = time.perf_counter()
+
+        with memory_phase("test"):
+            for start in range(0, len(images), chunk):
+                predictions.append(self.model.predict(images[start: start + chunk]))
+                probabilities.append(self.model.predict_proba(images[start: start + chunk]))
+
+        predictions = np.concatenate(predictions)
+        probabilities = np.vstack(probabilities)
+
+        batch_duration = time.perf_counter() - time_start
+
+        # Latency of single image predictions, as done by app.py
+        latencies = [].copy()
+
+        for image in images[np.linspace(0, len(images) - 1, min(latency_samples, len(images))).astype(int)]:
+            time_start = time.perf_counter()
+            self.model.predict_proba(image[None, :])
+            latencies.append(time.perf_counter() - time_start)
+
+        classes = list(self.model.classes_)
+        matrix = confusion_matrix(labels, predictions, labels = classes)
+        precision, recall, f1, support = precision_recall_fscore_support(labels, predictions, labels = classes, zero_division = 0)
+
+        report = {
+            "model": self.model_name,
+            "engine": self.trained_engine,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "images": len(images),
+            "accuracy": float((predictions == labels).mean()),
+            "confusion_matrix": {"labels": classes, "matrix": matrix.tolist()},
+            "classes": {c: {"precision": float(precision[x]), "recall": float(recall[x]), "f1": float(f1[x]), "support": int(support[x])} for x, c in enumerate(classes)},
+            "roc_auc": {},
+            "latency_ms": {f"p{p}": float(np.percentile(latencies, p) * 1000) for p in (50, 90, 99)},
+            "batch": {"seconds": batch_duration, "images_per_second": len(images) / batch_duration}
+        }
+
+        # ROC-AUC of every class against the rest
+        for x, c in enumerate(classes):
+            if c != "other" and len(np.unique(labels == c)) == 2:
+                report["roc_auc"][c] = float(roc_auc_score(labels == c, probabilities[:, x]))
+
         for class_name in self.classes:
-            images, labels = self.import_images(path = os.path.join(self.classes_path, class_name, self.classes_path_test), label = class_name)
-            
-            correct_predictions = 0
-            predictions_results = {}
+            print(f"[TEST] Correct predictions for class {class_name}: {round(report['classes'][class_name]['recall'] * 100)} %")
+
+        print(f"[TEST] Accuracy: {round(report['accuracy'] * 100, 2)} %, ROC-AUC: {report['roc_auc']}")
+        print(f"[TEST] Confusion matrix {classes}: {report['confusion_matrix']['matrix']}")
+        print(f"[TEST] Latency per image: {report['latency_ms']} ms, batch: {round(report['batch']['images_per_second'])} images/sec")
+
+        report_path = os.path.join(self.base_path, self.model_path, os.path.splitext(self.model_name)[0] + ".report.json")
+
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent = 4)
+
+        print(f"[INFO] Test report saved to {report_path}")
+
+        return report
+
+    def training_state(self) -> dict:
+        """
+        Describe what the model is trained on: the training images, the engine and parameters, and the feature stage.
+
+        Returns:
+        - dict: The state, None if the training images are not in the feature store.
+        """
+
+        if self.feature_store is None:
+            return None
+
+        h = hashlib.sha1()
+
+        # The feature store manifests identify the training images by content
+        for class_name in self.classes + self.classes_other:
+            path = os.path.join(self.classes_path, class_name, self.classes_path_training)
+            name = os.path.relpath(path, self.classes_path).replace(os.sep, "_")
+
+            self.feature_store.load(path = path, name = name)
+
+            h.update(f"{class_name}:{self.feature_store.signature(name)}\n".encode("utf-8"))
+
+        # The configured model is compared, also when the memory fallback replaced it
+        model = self.configured_model if self.configured_model is not None else self.model
+
+        state = {
+            "data": h.hexdigest(),
+            "engine": self.model_engine,
+            "trained_engine": self.trained_engine,
+            "memory_fallback": self.memory_budget if self.memory_fallback else None,
+            "params": {k: v for k, v in vars(model).items() if not k.startswith("_") and not k.endswith("_")},
+            "features": {k: v for k, v in vars(self.feature_stage).items() if not k.endswith("_")} if self.feature_stage is not None else None
+        }
+
+        return json.loads(json.dumps(state, default = str))
+
+    def saved_state(self) -> dict:
+        """
+        Get the training state saved with the model.
+
+        Returns:
+        - dict: The state, None if the model or its state do not exist.
+        """
+
+        state_path = os.path.join(self.base_path, self.model_path, os.path.splitext(self.model_name)[0] + ".state.json")
+
+        if not os.path.exists(state_path) or not os.path.exists(os.path.join(self.base_path, self.model_path, self.model_name)):
+            return None
+
+        with open(state_path, "r") as f:
+            return json.load(f)
+
+    def model_up_to_date(self) -> bool:
+        """
+        Check whether the saved model was trained on the current images with the current settings.
+
+        Returns:
+        - bool: True if the model does not need to be trained again.
+        """
+
+        state = self.training_state()
+        saved = self.saved_state()
+
+        if state is None or saved is None:
+            return False
+
+        # The engine used is only known once trained, the same images and settings lead to the same one
+        return all(saved.get(k) == v for k, v in state.items() if k != "trained_engine")
+
+    def model_warm_start(self) -> bool:
+        """
+        Load the saved model to continue its training, if only the training images changed since it was saved.
+
+        Returns:
+        - bool: True if the saved model was loaded.
+        """
+
+        state = self.training_state()
+        saved = self.saved_state()
+
+        if state is None or saved is None or any(state[k] != saved[k] for k in ("engine", "params", "features")):
+            return False
+
+        self.model = joblib.load(os.path.join(self.base_path, self.model_path, self.model_name))
 
-            for x, image in enumerate(images):
-                result = self.model.predict([image])
+        print(f"[INFO] Continuing from the saved model {self.model_name}")
 
-                if result[0] in predictions_results.keys():
-                    predictions_results[result[0]] = predictions_results[result[0]] + 1
-                else:
-                    predictions_results[result[0]] = 1
-                                
-                if result[0] == labels[x]:
-                    correct_predictions += 1
+        return True
 
-            print(f"[TEST] Correct predictions for class {class_name}: {round((correct_predictions/ len(images)) * 100)} %")
-            print(f"[TEST] Predictions results: {predictions_results}")
+    def feature_stage_save(self, directory: str = None) -> None:
+        """
+        Save the feature stage next to the models, or remove a previous one if the models use raw pixels.
 
-    def model_save(self) -> None:
+        Parameters:
+        - directory (str): The destination directory, None for the models directory.
+        """
+
+        directory = directory or os.path.join(self.base_path, self.model_path)
+
+        create_path(directory)
+
+        path = os.path.join(directory, FEATURE_STAGE_NAME)
+
+        if self.feature_stage is not None:
+            save_stage(self.feature_stage, path)
+
+            print(f"[INFO] Feature stage saved to {path}")
+
+        elif os.path.exists(path):
+            os.remove(path)
+
+            print(f"[INFO] Feature stage {path} removed")
+
+    def model_files(self, compact: bool = True) -> set:
+        """
+        Get the names of the files of the model in the models directory.
+
+        Parameters:
+        - compact (bool): Whether to include the compact model.
+
+        Returns:
+        - set: The model, its training state, its test report and its compact model.
+        """
+
+        stem = os.path.splitext(self.model_name)[0]
+        names = {self.model_name, stem + ".state.json", stem + ".report.json"}
+
+        if compact and self.model_compact_name is not None:
+            names.add(self.model_compact_name)
+
+        return names
+
+    def model_save(self, directory: str = None) -> None:
         """
         Save the trained model to a specified file path.
+
+        Parameters:
+        - directory (str): The destination directory, None for the models directory.
         """
 
+        directory = directory or os.path.join(self.base_path, self.model_path)
+
         print(f"[INFO] Saving the model to {self.model_name}")
         
-        create_path(self.base_path + "/" + self.model_path)
-        
-        joblib.dump(self.model, os.path.join(self.base_path, self.model_path, self.model_name))
+        create_path(directory)
+
+        # Write to a hidden file first so app.py never loads a partial model
+        tmp_path = os.path.join(directory, "." + self.model_name + ".tmp")
+
+        joblib.dump(self.model, tmp_path)
+        os.replace(tmp_path, os.path.join(directory, self.model_name))
+
+        # Saved after the model, so an interrupted save is retrained next time
+        state = self.training_state()
+
+        if state is not None:
+            state_path = os.path.join(directory, os.path.splitext(self.model_name)[0] + ".state.json")
+
+            with open(state_path + ".tmp", "w") as f:
+                json.dump(state, f, indent = 4)
+
+            os.replace(state_path + ".tmp", state_path)
+
+        # Export the model for serving without sklearn
+        if self.model_compact_name is not None:
+            self.compact_exported = export_model(self.model, os.path.join(directory, self.model_compact_name))
         
         print("[INFO] Model saved successfully")
 
@@ -198,44 +555,268 @@ class Algorithm(object):
         Train the model using the provided dataset.
         """
 
-        for class_name in self.classes:
-            images, labels = self.import_images(path = os.path.join(self.classes_path, class_name, self.classes_path_training), label = class_name)
-
-            self.training_images.extend(images)
-            self.training_labels.extend(labels)
+        if self.model_engine == "approx":
+            return self.model_run_stream()
 
-        for class_name in self.classes_other:
-            images, labels = self.import_images(path = os.path.join(self.classes_path, class_name, self.classes_path_training), label = "other")
-
-            self.training_images.extend(images)
-            self.training_labels.extend(labels)
+        with memory_phase("import"):
+            self.training_images, self.training_labels = self.import_matrix(split = self.classes_path_training)
 
         print("[INFO] Running training algorithm")
 
         time_start = time.time()
 
-        # Convert the list of 1D arrays to a 2D array
-        self.training_images = np.vstack(self.training_images)
+        # libsvm converts the uint8 matrix to a single float64 copy, stream minibatches when it does not fit
+        required = self.training_images.shape[0] * self.training_images.shape[1] * 8
+
+        if self.memory_budget is not None and required > self.memory_budget:
+            if not self.memory_fallback:
+                print(f"[ERROR] Training needs {required} bytes, more than the memory budget of {self.memory_budget} bytes, set the model engine to \"approx\" or enable the memory fallback")
+
+                raise MemoryError(f"Training {self.model_name} needs {required} bytes, more than the memory budget of {self.memory_budget} bytes")
 
-        self.model.fit(self.training_images, self.training_labels)
+            print(f"[INFO] Training needs {required} bytes, more than the memory budget of {self.memory_budget} bytes, falling back to the approx engine on minibatches")
+
+            self.configured_model = self.model
+            self.model = ApproxKernelClassifier(**self.model_approx)
+            self.trained_engine = "approx"
+
+        with memory_phase("training"):
+            self.model.fit(self.training_images, self.training_labels)
 
         print(f"[INFO] Running training algorithm has successfully finished in {time.time() - time_start} seconds")
 
+    def model_run_stream(self) -> None:
+        """
+        Train the model on minibatches streamed from the imported images, without stacking them into a single matrix.
+        """
+
+        sources = [].copy()
+
+        # With the feature store every source stays memory-mapped, only one minibatch is in memory at a time
+        for class_name in self.classes + self.classes_other:
+            images, _ = self.import_images(path = os.path.join(self.classes_path, class_name, self.classes_path_training), label = class_name)
+
+            if len(images) > 0:
+                sources.append((images, class_name if class_name in self.classes else "other"))
+
+        # Minibatch training can continue from the saved weights instead of starting over
+        warm_start = self.incremental and self.model_warm_start()
+
+        print(f"[INFO] Running streamed training algorithm on {sum(len(x) for x, _ in sources)} images")
+
+        time_start = time.time()
+
+        with memory_phase("training"):
+            self.model.fit_sources(sources, warm_start = warm_start)
+
+        print(f"[INFO] Running streamed training algorithm has successfully finished in {time.time() - time_start} seconds")
+
+def model_run_parallel(algorithms: list[Algorithm], workers: int = None, memory_budget: int = None, current: list[Algorithm] = None) -> None:
+    """
+    Train the models of several one-vs-rest Algorithm instances at the same time and save them once all of them succeed.
+
+    Parameters:
+    - algorithms (list[Algorithm]): Instances sharing the same classes, each one identifying one of them.
+    - current (list[Algorithm]): Every instance whose models must be kept, see models_publish.
+    - workers (int): Maximum number of worker processes, None to use one per model.
+    - memory_budget (int): Memory in bytes the workers may use, fewer workers run at once when every model does not fit, None for no limit.
+    """
+
+    a = algorithms[0]
+    images = {}
+
+    # Every instance uses the same training images, only the labels change
+    with memory_phase("import"):
+        for class_name in a.classes + a.classes_other:
+            images[class_name], _ = a.import_images(path = os.path.join(a.classes_path, class_name, a.classes_path_training), label = class_name)
+
+    # Every worker converts the shared uint8 matrix to its own float64 copy
+    if memory_budget is not None:
+        required = sum(x.size for x in images.values()) * 8
+
+        # Not even one model fits, the same policy as the sequential training applies
+        if required > memory_budget:
+            if not a.memory_fallback:
+                print(f"[ERROR] Every model needs {required} bytes, more than the memory budget of {memory_budget} bytes, set the model engine to \"approx\" or enable the memory fallback")
+
+                raise MemoryError(f"Training every model needs {required} bytes, more than the memory budget of {memory_budget} bytes")
+
+            print(f"[INFO] Every model needs {required} bytes, more than the memory budget of {memory_budget} bytes, training them one by one with the memory fallback")
+
+            del images
+
+            for x in algorithms:
+                x.model_run()
+
+            models_publish(algorithms, current)
+            return
+
+        workers = max(1, min(workers or len(algorithms), memory_budget // required))
+
+        print(f"[INFO] Every model needs {required} bytes, training {workers} models at once within the memory budget of {memory_budget} bytes")
+
+    with memory_phase("training"):
+        fitted = fit_parallel(images = images, models = {x.classes[0]: x.model for x in algorithms}, workers = workers)
+
+    for x in algorithms:
+        x.model = fitted[x.classes[0]]
+
+    models_publish(algorithms, current)
+
+def models_publish(algorithms: list[Algorithm], current: list[Algorithm] = None) -> None:
+    """
+    Save the feature stage and the models of several Algorithm instances, publishing them together.
+
+    Every file is written to a hidden staging directory, which the model registry of app.py does not watch,
+    and then moved into the models directory in a single burst of renames. The registry only loads a
+    directory that stayed the same on two consecutive checks, so it never serves the new models with the
+    previous feature stage or the other way round. The files of the models that are not published or kept,
+    e.g. of a class no longer configured, are only removed afterwards, so the directory is never empty.
+
+    Parameters:
+    - algorithms (list[Algorithm]): Trained instances sharing the same models directory and feature stage.
+    - current (list[Algorithm]): Every instance whose models must be kept, including the ones up to date, None for only the trained ones.
+    """
+
+    a = algorithms[0]
+    path = os.path.join(a.base_path, a.model_path)
+    staging = os.path.join(path, ".staging")
+
+    delete_path(staging, True)
+
+    # The models and app.py share the same feature stage
+    a.feature_stage_save(staging)
+
+    for x in algorithms:
+        x.model_save(staging)
+
+    # Without a feature stage the previous one is removed along with the publication
+    if a.feature_stage is None and os.path.exists(os.path.join(path, FEATURE_STAGE_NAME)):
+        os.remove(os.path.join(path, FEATURE_STAGE_NAME))
+
+    for name in sorted(os.listdir(staging)):
+        os.replace(os.path.join(staging, name), os.path.join(path, name))
+
+    delete_path(staging, True)
+
+    # A model that can not be exported, e.g. trained by the memory fallback, must not leave a previous compact model behind
+    keep = {FEATURE_STAGE_NAME}
+
+    for x in current or algorithms:
+        keep.update(x.model_files(compact = x not in algorithms or x.compact_exported))
+
+    with os.scandir(path) as it:
+        stale = [e.name for e in it if e.is_file() and not e.name.startswith(".") and e.name.endswith(MODEL_FILES) and e.name not in keep]
+
+    for name in sorted(stale):
+        os.remove(os.path.join(path, name))
+
+        print(f"[INFO] Previous model file {name} removed")
+
+    print(f"[INFO] Published {len(algorithms)} models to {path}")
+
+def fit_feature_stage(a: Algorithm, settings: dict, reuse: bool = False) -> FeatureStage:
+    """
+    Fit the feature stage on the raw training images of every class.
+
+    Parameters:
+    - a (Algorithm): Any instance, they all use the same training images.
+    - settings (dict): The parameters of the FeatureStage.
+    - reuse (bool): Whether to keep the saved stage if it has the same parameters, so the saved models stay valid.
+
+    Returns:
+    - FeatureStage: The fitted stage.
+    """
+
+    path = os.path.join(a.base_path, a.model_path, FEATURE_STAGE_NAME)
+
+    if reuse and os.path.exists(path):
+        stage = joblib.load(path)
+        parameters = {k: v for k, v in vars(FeatureStage(**settings)).items()}
+
+        if {k: v for k, v in vars(stage).items() if k in parameters} == parameters:
+            print(f"[INFO] Reusing the feature stage {path}")
+
+            return stage
+
+    print(f"[INFO] Fitting the {settings['method']} feature stage")
+
+    time_start = time.time()
+
+    with memory_phase("feature stage"):
+        images, _ = a.import_matrix(split = a.classes_path_training)
+        stage = FeatureStage(**settings).fit(images)
+
+    print(f"[INFO] Fitting the feature stage has successfully finished in {time.time() - time_start} seconds ({stage.num_features} features)")
+
+    return stage
+
 if __name__ == '__main__':
-    delete_path(config.model["path"] + "/" + config.model["path_models"], True)
+    # Decode every class and split once for all the models
+    feature_store = FeatureStore(path = os.path.join(config.dataset["path"], config.dataset["path_features"]))
+
+    algorithms = [].copy()
 
     for class_name in config.dataset["classes"]:
-        a = Algorithm(
+        algorithms.append(Algorithm(
             base_path = config.model["path"],
             model_path = config.model["path_models"],
             model_name = f'{class_name}_{config.model["name"]}',
+            model_compact_name = f'{class_name}_{config.model["compact_name"]}' if config.model["compact"] else None,
+            model_engine = config.model["engine"],
+            model_approx = config.model["approx"],
+            model_search = config.model["search"],
             model_grid_search = config.model["grid_search"],
             classes = [class_name],
             classes_other = [x for x in config.dataset["classes"] if not x == class_name],
             classes_path = os.path.join(config.dataset["path"], config.dataset["path_processed"]),
             classes_path_training = config.dataset["path_training"],
-            classes_path_test = config.dataset["path_test"]
-        )
-        a.model_run()
-        a.model_save()
-        a.model_test()
\ No newline at end of file
+            classes_path_test = config.dataset["path_test"],
+            feature_store = feature_store,
+            memory_budget = config.model["memory_budget"],
+            memory_fallback = config.model["memory_fallback"],
+            incremental = config.model["incremental"]
+        ))
+
+    # Fit the feature stage once, every model is trained on the same features
+    if config.model["features"]["method"] is not None:
+        feature_stage = fit_feature_stage(algorithms[0], config.model["features"], config.model["incremental"])
+
+        for a in algorithms:
+            a.feature_stage = feature_stage
+
+    # Apply the best parameters before training
+    if config.model["search"]["method"] is not None:
+        for a in algorithms:
+            a.model_best_parameters()
+
+    # Only train the models whose images or settings changed since they were saved
+    if config.model["incremental"]:
+        pending = [a for a in algorithms if not a.model_up_to_date()]
+
+        for a in algorithms:
+            if a not in pending:
+                print(f"[INFO] Model {a.model_name} is up to date")
+    else:
+        pending = algorithms
+
+    # The approx engine streams minibatches from the feature store instead of sharing a full training matrix
+    if len(pending) == 0:
+        print("[INFO] Every model is up to date")
+    elif config.model["parallel"] and config.model["engine"] == "svc":
+        # The models directory is kept, every model is replaced once all of them are trained
+        model_run_parallel(pending, config.model["parallel_workers"], config.model["memory_budget"], algorithms)
+
+        for a in pending:
+            a.model_test()
+    else:
+        # Every model is published once all of them are trained, along with the feature stage
+        for a in pending:
+            a.model_run()
+
+        models_publish(pending, algorithms)
+
+        for a in pending:
+            a.model_test()
+
+    default_loader().close()
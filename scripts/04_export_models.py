@@ -0,0 +1,31 @@
+import sys
+
+sys.path.insert(0, 'config')
+sys.path.insert(0, 'utils')
+
+import os
+import config
+import joblib
+from compact_model import export_model
+
+def main() -> None:
+    """
+    Export every trained model to the compact format used for serving without sklearn.
+    """
+
+    path = os.path.join(config.model["path"], config.model["path_models"])
+
+    for file in sorted(os.listdir(path)):
+        if not file.endswith(config.model["name"]) or file.startswith("."):
+            continue
+
+        compact_file = file[: -len(config.model["name"])] + config.model["compact_name"]
+
+        print(f"[INFO] Exporting {file} to {compact_file}")
+
+        export_model(joblib.load(os.path.join(path, file)), os.path.join(path, compact_file))
+
+    print("[INFO] Exporting models has successfully finished")
+
+if __name__ == "__main__":
+    main()
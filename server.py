@@ -0,0 +1,150 @@
+import sys
+
+sys.path.insert(0, 'utils')
+
+import os
+import asyncio
+import uvicorn
+from config import config
+from inference import Inference
+from startup import mark_ready
+from metrics import METRICS
+from concurrent.futures import ThreadPoolExecutor
+from starlette.routing import Route
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.applications import Starlette
+
+inference = Inference.from_config(config)
+
+# Pool running the decoding and the predictions outside the event loop
+executor = ThreadPoolExecutor(max_workers = config.server["api_workers"], thread_name_prefix = "classify")
+
+class BodyTooLarge(Exception):
+    pass
+
+def limit_body(request: Request, max_bytes: int) -> Request:
+    """
+    Wrap a request so that reading more than a limit of its body raises BodyTooLarge.
+
+    Chunked uploads do not announce their size, so the body is counted while it is received.
+
+    Parameters:
+    - request (Request): The request.
+    - max_bytes (int): Maximum size of the request body.
+
+    Returns:
+    - Request: The same request, reading its body through the limit.
+    """
+
+    received = 0
+
+    async def receive():
+        nonlocal received
+
+        message = await request.receive()
+
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+
+            if received > max_bytes:
+                raise BodyTooLarge()
+
+        return message
+
+    return Request(request.scope, receive)
+
+async def classify(request: Request) -> JSONResponse:
+    """
+    Classify the images of a request: either the raw bytes of one image or a multipart form with several images.
+    """
+
+    max_bytes = config.server["api_max_body"]
+    too_large = JSONResponse({"error": f"Request body larger than {max_bytes} bytes"}, status_code = 413)
+
+    # Reject early when the client announces the size
+    if int(request.headers.get("content-length", "0")) > max_bytes:
+        return too_large
+
+    request = limit_body(request, max_bytes)
+    content_type = request.headers.get("content-type", "")
+
+    # The limit is enforced here rather than in a middleware, so no other response has been started
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form(max_files = config.server["api_max_files"])
+            uploads = [(name, value) for name, value in form.multi_items() if hasattr(value, "read")]
+
+            names = [upload.filename or name for name, upload in uploads]
+            images = [await upload.read() for _, upload in uploads]
+        else:
+            names = None
+            images = [await request.body()]
+
+    except BodyTooLarge:
+        return too_large
+
+    if len(images) == 0 or any(len(image) == 0 for image in images):
+        return JSONResponse({"error": "No image received"}, status_code = 400)
+
+    try:
+        results = await asyncio.get_running_loop().run_in_executor(executor, inference.classify, images)
+
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code = 400)
+
+    if names is None:
+        return JSONResponse({"labels": results[0]})
+
+    return JSONResponse({"results": [{"filename": name, "labels": result} for name, result in zip(names, results)]})
+
+async def health(request: Request) -> JSONResponse:
+    """
+    Report the version of the models being served.
+    """
+
+    models = inference.registry.get()
+
+    return JSONResponse({"status": "ok", "version": models.version, "labels": models.labels})
+
+def startup() -> None:
+    """
+    Load the models, run the examples and signal that the server is ready.
+    """
+
+    mark_ready(config.server["ready_file"], False)
+
+    METRICS.enabled = config.server["metrics"]
+
+    inference.start()
+
+    if config.server["warm_up"]:
+        inference.warm_up([os.path.join("test", filename) for filename in os.listdir("test")])
+
+    mark_ready(config.server["ready_file"])
+
+async def metrics(request: Request) -> PlainTextResponse:
+    """
+    Export the inference metrics in the Prometheus text format.
+    """
+
+    return PlainTextResponse(METRICS.render(), media_type = "text/plain; version=0.0.4")
+
+app = Starlette(
+    routes = [
+        Route("/v1/classify", classify, methods = ["POST"]),
+        Route("/health", health, methods = ["GET"]),
+        Route("/metrics", metrics, methods = ["GET"])
+    ],
+    on_startup = [startup]
+)
+
+if __name__ == '__main__':
+    # Launch the HTTP server
+    uvicorn.run(
+        app,
+        host = "0.0.0.0",
+        port = config.server["api_port"],
+        timeout_keep_alive = config.server["api_keep_alive"],
+        log_level = "warning"
+    )
@@ -0,0 +1,217 @@
+import time
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+
+def iterate_batches(sources: list, batch_size: int, rng: np.random.Generator):
+    """
+    Stream shuffled minibatches from several image matrices without loading them into memory.
+
+    Parameters:
+    - sources (list): Tuples (images, labels), labels being an array with one label per row or a single label for every row.
+    - batch_size (int): Number of images per batch.
+    - rng (np.random.Generator): Random generator used to shuffle the rows.
+
+    Yields:
+    - tuple: Float32 images (uint8 pixels scaled to [0, 1], features as they are) and their labels.
+    """
+
+    offsets = np.cumsum([0] + [len(images) for images, _ in sources])
+    order = rng.permutation(offsets[-1])
+
+    for start in range(0, len(order), batch_size):
+        # Sorted indices read the memory-mapped files sequentially
+        rows = np.sort(order[start: start + batch_size])
+        which = np.searchsorted(offsets, rows, side = "right") - 1
+
+        images = np.empty((len(rows), sources[0][0].shape[1]), dtype = np.float32)
+        labels = np.empty(len(rows), dtype = object)
+
+        for s in np.unique(which):
+            mask = which == s
+            source_rows = rows[mask] - offsets[s]
+            source_images, source_labels = sources[s]
+
+            images[mask] = source_images[source_rows]
+            labels[mask] = source_labels if isinstance(source_labels, str) else np.asarray(source_labels)[source_rows]
+
+        if sources[0][0].dtype == np.uint8:
+            images /= 255
+
+        yield images, labels.astype(str)
+
+class ApproxKernelClassifier(object):
+
+    def __init__(self, *, method: str = "nystroem", n_components: int = 1000, gamma: float = None, alpha: float = 1e-4, batch_size: int = 1024, epochs: int = 5, warm_epochs: int = 1, random_state: int = 0) -> None:
+        """
+        Linear classifier over an approximation of the RBF kernel, trained incrementally on minibatches.
+
+        Parameters:
+        - method (str): Kernel approximation, either "nystroem" or "rff" (random Fourier features).
+        - n_components (int): Dimension of the approximated feature space.
+        - gamma (float): RBF kernel coefficient on images scaled to [0, 1], None to use 1 / (n_features * variance).
+        - alpha (float): Regularization of the linear classifier.
+        - batch_size (int): Number of images per minibatch.
+        - epochs (int): Number of passes over the training images.
+        - warm_epochs (int): Number of passes when continuing the training of a fitted model.
+        - random_state (int): Seed of the shuffling and of the kernel approximation.
+        """
+
+        self.method = method
+        self.n_components = n_components
+        self.gamma = gamma
+        self.alpha = alpha
+        self.batch_size = batch_size
+        self.epochs = epochs
+        self.warm_epochs = warm_epochs
+        self.random_state = random_state
+
+    def _transform(self, images) -> np.ndarray:
+        """
+        Map images to the approximated kernel feature space.
+
+        Parameters:
+        - images: Matrix with one flattened uint8 image (or feature vector) per row.
+
+        Returns:
+        - np.ndarray: The mapped images.
+        """
+
+        images = np.asarray(images)
+
+        if images.dtype == np.uint8:
+            return self.kernel_.transform(images.astype(np.float32) / 255)
+
+        return self.kernel_.transform(images.astype(np.float32))
+
+    def fit_sources(self, sources: list, warm_start: bool = False):
+        """
+        Fit the model streaming minibatches from several image matrices.
+
+        Parameters:
+        - sources (list): Tuples (images, labels), labels being an array with one label per row or a single label for every row.
+        - warm_start (bool): Whether to continue from the kernel approximation and weights of a previous fit, for warm_epochs passes.
+
+        Returns:
+        - ApproxKernelClassifier: The fitted model.
+        """
+
+        rng = np.random.default_rng(self.random_state)
+        classes = np.unique(np.concatenate([np.unique(np.atleast_1d(labels)) for _, labels in sources]).astype(str))
+
+        if warm_start and hasattr(self, "classifier_") and list(self.classes_) == list(classes):
+            print(f"[INFO] Continuing the training of the fitted model for {self.warm_epochs} epochs")
+
+            return self._epochs(sources, classes, self.warm_epochs, rng)
+
+        time_start = time.time()
+
+        # Fit the kernel approximation on a random sample of the images
+        sample, _ = next(iterate_batches(sources, max(self.n_components, 1), rng))
+        gamma = self.gamma if self.gamma is not None else 1 / (sample.shape[1] * sample.var())
+
+        if self.method == "rff":
+            self.kernel_ = RBFSampler(gamma = gamma, n_components = self.n_components, random_state = self.random_state)
+        else:
+            self.kernel_ = Nystroem(kernel = "rbf", gamma = gamma, n_components = min(self.n_components, len(sample)), random_state = self.random_state)
+
+        self.kernel_.fit(sample)
+
+        print(f"[INFO] Kernel approximation ({self.method}, gamma {gamma}) fitted in {time.time() - time_start} seconds")
+
+        self.classifier_ = SGDClassifier(loss = "log_loss", alpha = self.alpha, random_state = self.random_state)
+
+        return self._epochs(sources, classes, self.epochs, rng)
+
+    def _epochs(self, sources: list, classes: np.ndarray, epochs: int, rng: np.random.Generator):
+        """
+        Run passes of minibatch updates of the linear classifier.
+
+        Parameters:
+        - sources (list): Tuples (images, labels) as passed to fit_sources.
+        - classes (np.ndarray): Every label of the training images.
+        - epochs (int): Number of passes over the images.
+        - rng (np.random.Generator): Random generator used to shuffle the rows.
+
+        Returns:
+        - ApproxKernelClassifier: The fitted model.
+        """
+
+        for epoch in range(epochs):
+            time_start = time.time()
+
+            for images, labels in iterate_batches(sources, self.batch_size, rng):
+                self.classifier_.partial_fit(self.kernel_.transform(images), labels, classes = classes)
+
+            print(f"[INFO] Epoch {epoch + 1}/{epochs} finished in {time.time() - time_start} seconds")
+
+        self.classes_ = self.classifier_.classes_
+
+        return self
+
+    def fit(self, images, labels):
+        """
+        Fit the model on a matrix of images.
+
+        Parameters:
+        - images: Matrix with one flattened uint8 image per row.
+        - labels: The label of every image.
+
+        Returns:
+        - ApproxKernelClassifier: The fitted model.
+        """
+
+        return self.fit_sources([(images, np.asarray(labels))])
+
+    def _chunks(self, images):
+        """
+        Split a batch of images so the mapped features stay within one minibatch.
+
+        Parameters:
+        - images: Matrix with one flattened uint8 image per row.
+
+        Yields:
+        - The chunks of the matrix.
+        """
+
+        for start in range(0, len(images), self.batch_size):
+            yield images[start: start + self.batch_size]
+
+    def decision_function(self, images) -> np.ndarray:
+        """
+        Compute the signed distance of a batch of images to the decision boundary.
+
+        Parameters:
+        - images: Matrix with one flattened uint8 image per row.
+
+        Returns:
+        - np.ndarray: The decision value of every image.
+        """
+
+        return np.concatenate([self.classifier_.decision_function(self._transform(x)) for x in self._chunks(images)])
+
+    def predict_proba(self, images) -> np.ndarray:
+        """
+        Compute the probability of every class for a batch of images.
+
+        Parameters:
+        - images: Matrix with one flattened uint8 image per row.
+
+        Returns:
+        - np.ndarray: Matrix with one row per image and one column per class.
+        """
+
+        return np.vstack([self.classifier_.predict_proba(self._transform(x)) for x in self._chunks(images)])
+
+    def predict(self, images) -> np.ndarray:
+        """
+        Predict the class of a batch of images.
+
+        Parameters:
+        - images: Matrix with one flattened uint8 image per row.
+
+        Returns:
+        - np.ndarray: The predicted class of every image.
+        """
+
+        return np.concatenate([self.classifier_.predict(self._transform(x)) for x in self._chunks(images)])
@@ -0,0 +1,106 @@
+import time
+import queue
+import threading
+import numpy as np
+from concurrent.futures import Future
+
+class MicroBatcher(object):
+
+    def __init__(self, *, predict, max_batch_size: int = 32, max_delay: float = 0.005) -> None:
+        """
+        Group concurrent predictions into batches so the models run once per batch.
+
+        Parameters:
+        - predict (callable): Function receiving a matrix with one image per row and returning one result per image.
+        - max_batch_size (int): Maximum number of images per batch.
+        - max_delay (float): Maximum seconds to wait for more images once the first one arrives.
+        """
+
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _collect(self) -> list:
+        """
+        Wait for the next image and collect the ones arriving before the deadline.
+
+        Returns:
+        - list: Tuples (image, future) of the batch.
+        """
+
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+
+            try:
+                if timeout > 0:
+                    batch.append(self._queue.get(timeout = timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self) -> None:
+        """
+        Run the batches until the process ends.
+        """
+
+        while True:
+            batch = self._collect()
+
+            # Skip the images whose callers are no longer waiting
+            batch = [(image, future) for image, future in batch if future.set_running_or_notify_cancel()]
+
+            if len(batch) == 0:
+                continue
+
+            try:
+                results = self.predict(np.vstack([image for image, _ in batch]))
+
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+                continue
+
+            for x, (_, future) in enumerate(batch):
+                future.set_result(results[x])
+
+    def start(self) -> None:
+        """
+        Start the batching thread.
+        """
+
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(target = self._run, name = "micro-batcher", daemon = True)
+            self._thread.start()
+
+    def submit(self, image: np.ndarray) -> Future:
+        """
+        Queue an image for the next batch.
+
+        Parameters:
+        - image (np.ndarray): The flattened image.
+
+        Returns:
+        - Future: Future resolved with the result of the image.
+        """
+
+        self.start()
+
+        future = Future()
+        self._queue.put((image, future))
+
+        return future
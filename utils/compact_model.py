@@ -0,0 +1,177 @@
+import os
+import json
+import numpy as np
+from fused import FusedSVC, svc_parameters
+
+# File layout: magic, header length (uint32), JSON header, aligned arrays
+MAGIC = b"CERESSVC"
+ALIGNMENT = 64
+
+def _align(offset: int) -> int:
+    """
+    Round an offset up to the array alignment.
+
+    Parameters:
+    - offset (int): The offset in bytes.
+
+    Returns:
+    - int: The aligned offset.
+    """
+
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def export_model(model, path: str, dtype = np.float32) -> bool:
+    """
+    Export a fitted binary SVC to the compact format.
+
+    Parameters:
+    - model: The fitted SVC model.
+    - path (str): The destination file.
+    - dtype: The type used to store the support vectors.
+
+    Returns:
+    - bool: True if the model is exported, False if it is not supported.
+    """
+
+    # Find the index of the label that is not "other"
+    non_other_index = int(np.where(model.classes_ != "other")[0][0])
+
+    p = svc_parameters(model, non_other_index)
+
+    if p is None:
+        print(f"[INFO] Model {path} is not a supported SVC, not exporting it")
+        return False
+
+    arrays = {
+        "support_vectors": np.ascontiguousarray(p["support_vectors"], dtype = dtype),
+        "dual_coef": np.ascontiguousarray(p["dual_coef"], dtype = np.float64)
+    }
+
+    # Check how libsvm couples the probabilities of this model
+    fused = FusedSVC(labels = ["model"], parameters = [p])
+    fused.verify([(model, non_other_index)], p["support_vectors"][: 8])
+
+    header = {
+        "kernel": p["kernel"],
+        "gamma": float(p["gamma"]),
+        "coef0": float(p["coef0"]),
+        "degree": int(p["degree"]),
+        "intercept": p["intercept"],
+        "prob_a": p["prob_a"],
+        "prob_b": p["prob_b"],
+        "classes": [str(c) for c in model.classes_],
+        "coupled": fused.coupled,
+        "arrays": {}
+    }
+
+    # Place every array after the header, leaving room for the offsets themselves
+    size = len(json.dumps(header)) + 256 * len(arrays)
+    offset = _align(len(MAGIC) + 4 + size)
+
+    for name, array in arrays.items():
+        header["arrays"][name] = {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+        offset = _align(offset + array.nbytes)
+
+    encoded = json.dumps(header).encode("utf-8")
+
+    # Write to a hidden file first so readers never see a partial model
+    tmp_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(4, "little"))
+        f.write(encoded)
+
+        for name, array in arrays.items():
+            f.seek(header["arrays"][name]["offset"])
+            f.write(array.tobytes())
+
+        f.truncate(offset)
+
+    os.replace(tmp_path, path)
+
+    return True
+
+class CompactSVC(object):
+
+    def __init__(self, path: str) -> None:
+        """
+        Evaluate a model exported with export_model using only NumPy.
+
+        The arrays are memory-mapped, so processes loading the same file share its pages.
+
+        Parameters:
+        - path (str): The exported model.
+        """
+
+        self.path = path
+
+        buffer = np.memmap(path, dtype = np.uint8, mode = "r")
+
+        if bytes(buffer[: len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a compact model")
+
+        length = int.from_bytes(bytes(buffer[len(MAGIC): len(MAGIC) + 4]), "little")
+        header = json.loads(bytes(buffer[len(MAGIC) + 4: len(MAGIC) + 4 + length]).decode("utf-8"))
+
+        arrays = {}
+
+        for name, a in header["arrays"].items():
+            arrays[name] = np.ndarray(tuple(a["shape"]), dtype = np.dtype(a["dtype"]), buffer = buffer, offset = a["offset"])
+
+        # Same attributes as a fitted SVC
+        self.kernel = header["kernel"]
+        self._gamma = header["gamma"]
+        self.coef0 = header["coef0"]
+        self.degree = header["degree"]
+        self.classes_ = np.array(header["classes"])
+        self.support_vectors_ = arrays["support_vectors"]
+        self.dual_coef_ = arrays["dual_coef"][None, :]
+        self.intercept_ = np.array([header["intercept"]])
+        self.probA_ = np.array([header["prob_a"]])
+        self.probB_ = np.array([header["prob_b"]])
+        self.coupled = header["coupled"]
+
+        p = svc_parameters(self, 1)
+        self._fused = FusedSVC(labels = [str(self.classes_[1])], parameters = [p], coupled = self.coupled)
+
+    def decision_function(self, images) -> np.ndarray:
+        """
+        Compute the decision value of a batch of images.
+
+        Parameters:
+        - images: Matrix with one flattened image per row.
+
+        Returns:
+        - np.ndarray: One decision value per image, positive for the second class.
+        """
+
+        return self._fused.decision_function(images)[:, 0]
+
+    def predict_proba(self, images) -> np.ndarray:
+        """
+        Compute the probability of both classes for a batch of images.
+
+        Parameters:
+        - images: Matrix with one flattened image per row.
+
+        Returns:
+        - np.ndarray: Matrix with one row per image and one column per class.
+        """
+
+        probability = self._fused.predict_proba(images)[:, 0]
+
+        return np.column_stack([1 - probability, probability])
+
+    def predict(self, images) -> np.ndarray:
+        """
+        Predict the class of a batch of images.
+
+        Parameters:
+        - images: Matrix with one flattened image per row.
+
+        Returns:
+        - np.ndarray: The predicted class of every image.
+        """
+
+        return self.classes_[(self.decision_function(images) > 0).astype(int)]
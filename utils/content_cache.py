@@ -0,0 +1,67 @@
+import os
+import json
+
+class ContentCache(object):
+    def __init__(self, path: str, settings: dict) -> None:
+        """
+        Initialize a persistent cache of per-image results keyed by the content hash of the files.
+
+        Parameters:
+        - path (str): The JSON file of the cache, loaded if it exists with the same settings.
+        - settings (dict): The settings the results depend on, the cache is discarded when they change.
+        """
+
+        self.path = path
+        self.settings = json.loads(json.dumps(settings))
+        self.values = {}
+
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                cache = json.load(f)
+
+            # Caches written with other settings or in another format are computed again
+            if cache.get("settings") == self.settings:
+                self.values = cache.get("values", {})
+
+    def compute(self, paths: list[str], workers: int = None) -> list:
+        """
+        Compute the results of several files, implemented by every cache.
+
+        Parameters:
+        - paths (list[str]): The paths to the files.
+        - workers (int): Number of worker processes, None to use every CPU.
+
+        Returns:
+        - list: The results in the same order.
+        """
+
+        raise NotImplementedError
+
+    def update(self, files: dict, workers: int = None) -> int:
+        """
+        Compute the results of the files that are not in the cache yet.
+
+        Parameters:
+        - files (dict): The paths to the files by content hash.
+        - workers (int): Number of worker processes, None to use every CPU.
+
+        Returns:
+        - int: Number of files computed.
+        """
+
+        missing = [x for x in files.keys() if x not in self.values]
+
+        for digest, value in zip(missing, self.compute([files[x] for x in missing], workers)):
+            self.values[digest] = value
+
+        return len(missing)
+
+    def save(self) -> None:
+        """
+        Save the cache atomically.
+        """
+
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"settings": self.settings, "values": self.values}, f)
+
+        os.replace(self.path + ".tmp", self.path)
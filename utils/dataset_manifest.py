@@ -0,0 +1,163 @@
+import os
+import json
+import time
+from utils import create_path, delete_path, link_file
+from feature_store import file_hash
+
+def scan_dataset(path: str, classes: list[str], previous: list = None) -> list:
+    """
+    List the images of every class in a single pass, with their content hash.
+
+    Parameters:
+    - path (str): The folder with one subfolder per class.
+    - classes (list[str]): The class names.
+    - previous (list): Records of a previous manifest, whose hashes are reused for the files that did not change.
+
+    Returns:
+    - list: One record (path, size, mtime, ext, hash, class, split, name, removed) per file, sorted by path.
+    """
+
+    cache = {(r["path"], r["size"], r["mtime"]): r["hash"] for r in previous or []}
+    records = [].copy()
+
+    time_start = time.time()
+
+    for class_name in classes:
+        stack = [os.path.join(path, class_name)]
+
+        while len(stack) > 0:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    entries = list(it)
+
+            except FileNotFoundError:
+                print(f"[ERROR] Path {path}/{class_name} does not exist")
+                continue
+
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                    continue
+
+                if not entry.is_file():
+                    continue
+
+                stat = entry.stat()
+                digest = cache.get((entry.path, stat.st_size, stat.st_mtime_ns))
+
+                records.append({
+                    "path": entry.path,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime_ns,
+                    "ext": os.path.splitext(entry.name)[1][1:].lower(),
+                    "hash": digest if digest is not None else file_hash(entry.path),
+                    "class": class_name,
+                    "split": None,
+                    "name": None,
+                    "removed": None
+                })
+
+    records.sort(key = lambda r: r["path"])
+
+    print(f"[INFO] Scanned {len(records)} images in {time.time() - time_start} seconds")
+
+    return records
+
+def kept(records: list, class_name: str = None) -> list:
+    """
+    Get the records that were not removed by any stage.
+
+    Parameters:
+    - records (list): The manifest records.
+    - class_name (str): Only return the records of this class, None for every class.
+
+    Returns:
+    - list: The kept records.
+    """
+
+    return [r for r in records if r["removed"] is None and (class_name is None or r["class"] == class_name)]
+
+def remove(records: list, reason: str) -> int:
+    """
+    Mark records as removed, keeping the first reason of every record.
+
+    Parameters:
+    - records (list): The records to remove.
+    - reason (str): The stage removing them.
+
+    Returns:
+    - int: Number of records newly removed.
+    """
+
+    count = 0
+
+    for r in records:
+        if r["removed"] is None:
+            r["removed"] = reason
+            count += 1
+
+    return count
+
+def load_manifest(path: str) -> list:
+    """
+    Load the records of a saved manifest.
+
+    Parameters:
+    - path (str): The manifest file.
+
+    Returns:
+    - list: The records, empty if the manifest does not exist.
+    """
+
+    if not os.path.exists(path):
+        return []
+
+    with open(path, "r") as f:
+        return json.load(f)["records"]
+
+def save_manifest(path: str, records: list) -> None:
+    """
+    Save the records of a manifest atomically.
+
+    Parameters:
+    - path (str): The manifest file.
+    - records (list): The records.
+    """
+
+    with open(path + ".tmp", "w") as f:
+        json.dump({"date": time.strftime("%Y-%m-%dT%H:%M:%S"), "records": records}, f)
+
+    os.replace(path + ".tmp", path)
+
+def materialise(records: list, path: str, classes: list[str], splits: list[str]) -> dict:
+    """
+    Build the processed tree (class/split/name) from the kept records, linking the original files.
+
+    Parameters:
+    - records (list): The manifest records, with their class, split and name assigned.
+    - path (str): The processed folder, replaced entirely.
+    - classes (list[str]): The class names.
+    - splits (list[str]): The split folders created for every class.
+
+    Returns:
+    - dict: Number of files per method used (see link_file).
+    """
+
+    delete_path(path, True)
+
+    methods = {}
+
+    # Every class gets every split, even when none of its images were assigned to it
+    for class_name in classes:
+        for split in splits:
+            create_path(os.path.join(path, class_name, split))
+
+    for r in kept(records):
+        folder = os.path.join(path, r["class"], r["split"])
+
+        method = link_file(r["path"], os.path.join(folder, r["name"]))
+        methods[method] = methods.get(method, 0) + 1
+
+    print(f"[INFO] Processed dataset built in {path}: {methods}")
+
+    return methods
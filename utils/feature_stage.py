@@ -0,0 +1,165 @@
+import os
+import cv2 as cv
+import numpy as np
+from imaging import IMAGE_SIZE
+
+# Name of the feature stage inside the models directory
+FEATURE_STAGE_NAME = "feature_stage.joblib"
+
+# Shape of the flattened BGR images (height, width, channels)
+IMAGE_SHAPE = (IMAGE_SIZE[1], IMAGE_SIZE[0], 3)
+
+# HOG over the largest 8x8-cell window inside the image
+HOG = cv.HOGDescriptor((48, 48), (16, 16), (8, 8), (8, 8), 9)
+
+def color_histogram(images: np.ndarray, bins: int = 8) -> np.ndarray:
+    """
+    Compute the normalised joint BGR histogram of a batch of images.
+
+    Parameters:
+    - images (np.ndarray): Matrix with one flattened uint8 image per row.
+    - bins (int): Bins per channel, a power of two.
+
+    Returns:
+    - np.ndarray: Float32 matrix with bins ** 3 columns.
+    """
+
+    shift = 8 - int(np.log2(bins))
+    pixels = np.asarray(images, dtype = np.uint8).reshape(len(images), -1, 3) >> shift
+
+    # Index of the joint bin of every pixel, offset by row so a single bincount covers the batch
+    index = (pixels[..., 0].astype(np.int64) * bins + pixels[..., 1]) * bins + pixels[..., 2]
+    index += np.arange(len(images))[:, None] * bins ** 3
+
+    histogram = np.bincount(index.ravel(), minlength = len(images) * bins ** 3).reshape(len(images), -1).astype(np.float32)
+
+    return histogram / pixels.shape[1]
+
+def hog(images: np.ndarray) -> np.ndarray:
+    """
+    Compute the HOG descriptor of the grayscale version of a batch of images.
+
+    Parameters:
+    - images (np.ndarray): Matrix with one flattened uint8 image per row.
+
+    Returns:
+    - np.ndarray: Float32 matrix with one descriptor per row.
+    """
+
+    descriptors = [].copy()
+
+    for image in np.asarray(images, dtype = np.uint8).reshape((-1, ) + IMAGE_SHAPE):
+        gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+        descriptors.append(HOG.compute(gray[: 48, : 48]).ravel())
+
+    return np.array(descriptors, dtype = np.float32).reshape(len(images), -1)
+
+class FeatureStage(object):
+
+    def __init__(self, *, method: str = "pca", n_components: int = 100, whiten: bool = True, batch_size: int = 1024) -> None:
+        """
+        Map raw pixel vectors to compact features, fitted once on the training images and shared by every model.
+
+        Parameters:
+        - method (str): "pca" for PCA over the scaled pixels, "descriptors" for colour histogram + HOG.
+        - n_components (int): Number of PCA components.
+        - whiten (bool): Whether the PCA components are scaled to unit variance.
+        - batch_size (int): Number of images transformed at once.
+        """
+
+        self.method = method
+        self.n_components = n_components
+        self.whiten = whiten
+        self.batch_size = batch_size
+
+    def _features(self, images: np.ndarray) -> np.ndarray:
+        """
+        Compute the features of a batch of images before standardisation.
+
+        Parameters:
+        - images (np.ndarray): Matrix with one flattened uint8 image per row.
+
+        Returns:
+        - np.ndarray: Float32 features.
+        """
+
+        if self.method == "descriptors":
+            return np.hstack([color_histogram(images), hog(images)])
+
+        return self.pca_.transform(np.asarray(images, dtype = np.float32) / 255).astype(np.float32)
+
+    def fit(self, images: np.ndarray):
+        """
+        Fit the stage on the training images.
+
+        Parameters:
+        - images (np.ndarray): Matrix with one flattened uint8 image per row.
+
+        Returns:
+        - FeatureStage: The fitted stage.
+        """
+
+        if self.method == "pca":
+            from sklearn.decomposition import PCA
+
+            self.pca_ = PCA(n_components = min(self.n_components, *images.shape), whiten = self.whiten, svd_solver = "randomized", random_state = 0)
+            self.pca_.fit(np.asarray(images, dtype = np.float32) / 255)
+
+            self.mean_ = None
+            self.scale_ = None
+        else:
+            # Standardise the descriptors so the histogram and HOG parts weigh the same in the kernel
+            features = np.vstack([self._features(images[start: start + self.batch_size]) for start in range(0, len(images), self.batch_size)])
+
+            self.mean_ = features.mean(axis = 0)
+            self.scale_ = np.where(features.std(axis = 0) > 1e-6, features.std(axis = 0), 1).astype(np.float32)
+
+        return self
+
+    def transform(self, images) -> np.ndarray:
+        """
+        Map a batch of images to features.
+
+        Parameters:
+        - images: Matrix with one flattened uint8 image per row.
+
+        Returns:
+        - np.ndarray: Float32 matrix with one feature vector per row.
+        """
+
+        features = np.vstack([self._features(images[start: start + self.batch_size]) for start in range(0, len(images), self.batch_size)]) if len(images) > 0 else np.empty((0, self.num_features), dtype = np.float32)
+
+        if self.mean_ is not None:
+            features = (features - self.mean_) / self.scale_
+
+        return features
+
+    @property
+    def num_features(self) -> int:
+        """
+        Get the number of features of every image.
+
+        Returns:
+        - int: The length of the feature vectors.
+        """
+
+        if self.method == "descriptors":
+            return len(self.mean_)
+
+        return self.pca_.n_components_
+
+def save_stage(stage: FeatureStage, path: str) -> None:
+    """
+    Save a fitted stage, replacing the previous one atomically.
+
+    Parameters:
+    - stage (FeatureStage): The fitted stage.
+    - path (str): The destination file.
+    """
+
+    import joblib
+
+    tmp_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+
+    joblib.dump(stage, tmp_path)
+    os.replace(tmp_path, path)
@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from imaging import IMAGE_SIZE
+from shm_loader import IMAGE_LENGTH, SharedMemoryLoader, default_loader
+
+# Shape of every stored image (height, width, channels)
+IMAGE_SHAPE = (IMAGE_SIZE[1], IMAGE_SIZE[0], 3)
+
+def file_hash(path: str) -> str:
+    """
+    Compute the content hash of a file.
+
+    Parameters:
+    - path (str): The path to the file.
+
+    Returns:
+    - str: The hexadecimal SHA-1 of the file.
+    """
+
+    h = hashlib.sha1()
+
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+
+    return h.hexdigest()
+
+def _copy_rows(destination: np.ndarray, source: np.ndarray, pairs: np.ndarray, chunk: int = 1024) -> None:
+    """
+    Copy rows between two arrays in chunks, so neither is ever fully loaded in memory.
+
+    Parameters:
+    - destination (np.ndarray): The array written, e.g. a memory-mapped file.
+    - source (np.ndarray): The array read, e.g. a memory-mapped file.
+    - pairs (np.ndarray): One (destination row, source row) pair per row copied.
+    - chunk (int): Number of rows copied at a time.
+    """
+
+    for start in range(0, len(pairs), chunk):
+        part = pairs[start: start + chunk]
+        destination[part[:, 0]] = source[part[:, 1]]
+
+class FeatureStore(object):
+
+    def __init__(self, *, path: str, loader: SharedMemoryLoader = None) -> None:
+        """
+        Store of decoded and resized images, materialised once per class and split and memory-mapped afterwards.
+
+        Parameters:
+        - path (str): The folder where the arrays and their manifests are saved.
+        - loader (SharedMemoryLoader): The loader decoding the images, None to use the shared one.
+        """
+
+        self.path = path
+        self.loader = loader or default_loader()
+
+        # Arrays already validated by this process
+        self._loaded = {}
+        self._signatures = {}
+
+    def _scan(self, path: str, previous: dict) -> list:
+        """
+        List the images of a folder with their content hash.
+
+        Parameters:
+        - path (str): The folder with the images.
+        - previous (dict): Entries of the previous manifest indexed by file name.
+
+        Returns:
+        - list: One entry (name, size, mtime, hash) per file, sorted by name.
+        """
+
+        files = [].copy()
+
+        with os.scandir(path) as it:
+            entries = sorted((entry for entry in it if entry.is_file()), key = lambda entry: entry.name)
+
+        for entry in entries:
+            stat = entry.stat()
+            old = previous.get(entry.name)
+
+            # Only hash the files that changed since the previous manifest
+            if old is not None and old["size"] == stat.st_size and old["mtime"] == stat.st_mtime_ns:
+                digest = old["hash"]
+            else:
+                digest = file_hash(entry.path)
+
+            files.append({"name": entry.name, "size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": digest})
+
+        return files
+
+    def _build(self, path: str, files: list, data_path: str) -> list:
+        """
+        Decode the images of a folder into an array file.
+
+        Parameters:
+        - path (str): The folder with the images.
+        - files (list): The entries returned by _scan.
+        - data_path (str): The array file to write.
+
+        Returns:
+        - list: The row of every file in the array, -1 for the ones that can not be decoded.
+        """
+
+        paths = [os.path.join(path, f["name"]) for f in files]
+
+        # The images are decoded directly into the array file, a window at a time
+        tmp_path = data_path + ".tmp.npy"
+        data = np.lib.format.open_memmap(tmp_path, mode = "w+", dtype = np.uint8, shape = (len(paths), ) + IMAGE_SHAPE)
+
+        _, decoded = self.loader.load(paths, out = data.reshape(len(paths), IMAGE_LENGTH))
+
+        rows = np.where(decoded, np.cumsum(decoded) - 1, -1).tolist()
+
+        # Drop the rows of the images that can not be decoded
+        if not decoded.all():
+            compact_path = data_path + ".compact.npy"
+            compact = np.lib.format.open_memmap(compact_path, mode = "w+", dtype = np.uint8, shape = (int(decoded.sum()), ) + IMAGE_SHAPE)
+
+            _copy_rows(compact, data, np.stack([np.arange(len(compact)), np.flatnonzero(decoded)], axis = 1))
+
+            compact.flush()
+            del compact, data
+
+            os.replace(compact_path, tmp_path)
+
+        else:
+            data.flush()
+            del data
+
+        os.replace(tmp_path, data_path)
+
+        return rows
+
+    def _update(self, path: str, files: list, manifest: dict, data_path: str) -> list:
+        """
+        Update an array file, decoding only the images that were added or changed since the previous manifest.
+
+        Parameters:
+        - path (str): The folder with the images.
+        - files (list): The entries returned by _scan.
+        - manifest (dict): The previous manifest.
+        - data_path (str): The array file to update.
+
+        Returns:
+        - list: The row of every file in the array, -1 for the ones that can not be decoded.
+        """
+
+        previous = {(f["name"], f["hash"]): f["row"] for f in manifest["files"]}
+        kept = [previous.get((f["name"], f["hash"])) for f in files]
+
+        added = [f for f, row in zip(files, kept) if row is None]
+
+        names = set(f["name"] for f in files)
+
+        print(f"[INFO] {len(added)} images added or changed, {sum(f['name'] not in names for f in manifest['files'])} removed")
+
+        # The added images are decoded into a temporary array file rather than in memory
+        new_path = data_path + ".new.npy"
+        images = np.lib.format.open_memmap(new_path, mode = "w+", dtype = np.uint8, shape = (len(added), ) + IMAGE_SHAPE)
+
+        _, decoded = self.loader.load([os.path.join(path, f["name"]) for f in added], out = images.reshape(len(added), IMAGE_LENGTH))
+
+        # Every decodable file gets the next row, copied from the previous array or from the new images
+        rows = [].copy()
+        from_old = [].copy()
+        from_new = [].copy()
+        x = 0
+
+        for row in kept:
+            if row is None:
+                ok = bool(decoded[x])
+                source = (from_new, x)
+                x += 1
+            else:
+                ok = row >= 0
+                source = (from_old, row)
+
+            if not ok:
+                rows.append(-1)
+                continue
+
+            rows.append(len(from_old) + len(from_new))
+            source[0].append((rows[-1], source[1]))
+
+        from_old = np.array(from_old, dtype = np.int64).reshape(-1, 2)
+        from_new = np.array(from_new, dtype = np.int64).reshape(-1, 2)
+
+        old = np.load(data_path, mmap_mode = "r")
+
+        tmp_path = data_path + ".tmp.npy"
+        data = np.lib.format.open_memmap(tmp_path, mode = "w+", dtype = np.uint8, shape = (len(from_old) + len(from_new), ) + IMAGE_SHAPE)
+
+        # Copy the rows in chunks, so neither the previous array nor the new images are ever fully loaded
+        _copy_rows(data, old, from_old)
+        _copy_rows(data, images, from_new)
+
+        data.flush()
+        del data, old, images
+
+        os.replace(tmp_path, data_path)
+        os.remove(new_path)
+
+        return rows
+
+    def _stat(self, data_path: str) -> list:
+        """
+        Identify the version of an array file.
+
+        Parameters:
+        - data_path (str): The array file.
+
+        Returns:
+        - list: The inode, size and modification time of the file.
+        """
+
+        stat = os.stat(data_path)
+
+        return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+    def signature(self, name: str) -> str:
+        """
+        Get the hash of the contents of a loaded array.
+
+        Parameters:
+        - name (str): The name of the stored array.
+
+        Returns:
+        - str: The hexadecimal SHA-1 of the names and hashes of the stored images.
+        """
+
+        return self._signatures[name]
+
+    def load(self, *, path: str, name: str) -> tuple:
+        """
+        Get the decoded images of a folder, rebuilding the stored array only if the images changed.
+
+        Parameters:
+        - path (str): The folder with the images.
+        - name (str): The name of the stored array (e.g. class and split).
+
+        Returns:
+        - tuple: Memory-mapped uint8 array (N, height, width, 3) and the names of the files of every row.
+        """
+
+        if name in self._loaded:
+            return self._loaded[name]
+
+        os.makedirs(self.path, exist_ok = True)
+
+        data_path = os.path.join(self.path, name + ".npy")
+        manifest_path = os.path.join(self.path, name + ".json")
+
+        manifest = None
+
+        if os.path.exists(manifest_path) and os.path.exists(data_path):
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+
+        previous = {f["name"]: f for f in manifest["files"]} if manifest is not None else {}
+        files = self._scan(path, previous)
+
+        signature = [(f["name"], f["hash"]) for f in files]
+
+        # The rows of a manifest only describe the array file written with it
+        if manifest is not None and (manifest["image_shape"] != list(IMAGE_SHAPE) or manifest.get("data") != self._stat(data_path)):
+            manifest = None
+
+        if manifest is not None and [(f["name"], f["hash"]) for f in manifest["files"]] == signature:
+            rows = [f["row"] for f in manifest["files"]]
+
+            print(f"[INFO] Feature store {name} is up to date")
+        elif manifest is not None:
+            print(f"[INFO] Updating feature store {name}")
+
+            time_start = time.time()
+            rows = self._update(path, files, manifest, data_path)
+
+            print(f"[INFO] Updating feature store {name} has successfully finished in {time.time() - time_start} seconds")
+        else:
+            print(f"[INFO] Building feature store {name} from {len(files)} images")
+
+            time_start = time.time()
+            rows = self._build(path, files, data_path)
+
+            print(f"[INFO] Building feature store {name} has successfully finished in {time.time() - time_start} seconds")
+
+        for f, row in zip(files, rows):
+            f["row"] = row
+
+        # The manifest is written last, so an interrupted build is detected next time
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump({"image_shape": list(IMAGE_SHAPE), "data": self._stat(data_path), "files": files}, f)
+
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        data = np.load(data_path, mmap_mode = "r")
+        names = [f["name"] for f in files if f["row"] >= 0]
+
+        self._loaded[name] = (data, names)
+        self._signatures[name] = hashlib.sha1(json.dumps([(f["name"], f["hash"]) for f in files if f["row"] >= 0]).encode("utf-8")).hexdigest()
+
+        return self._loaded[name]
@@ -0,0 +1,293 @@
+import numpy as np
+
+# Probability bounds used by libsvm
+MIN_PROB = 1e-7
+
+def _kernel(images: np.ndarray, vectors: np.ndarray, norms: np.ndarray, kernel: str, gamma: float, coef0: float, degree: int) -> np.ndarray:
+    """
+    Compute the kernel between a batch of images and a set of support vectors.
+
+    Parameters:
+    - images (np.ndarray): Matrix with one image per row.
+    - vectors (np.ndarray): Matrix with one support vector per row.
+    - norms (np.ndarray): Squared norm of every support vector.
+    - kernel (str): The kernel name, as used by SVC.
+    - gamma (float): The kernel coefficient.
+    - coef0 (float): The independent term of the poly and sigmoid kernels.
+    - degree (int): The degree of the poly kernel.
+
+    Returns:
+    - np.ndarray: Matrix with one row per image and one column per support vector.
+    """
+
+    # Work in the precision of the support vectors so they are never copied
+    images = images.astype(vectors.dtype, copy = False)
+    dot = images @ vectors.T
+
+    if kernel == "linear":
+        return dot
+
+    if kernel == "poly":
+        return (gamma * dot + coef0) ** degree
+
+    if kernel == "sigmoid":
+        return np.tanh(gamma * dot + coef0)
+
+    # RBF: ||x - v||^2 = ||x||^2 + ||v||^2 - 2 x.v
+    distances = np.einsum("ij,ij->i", images, images, dtype = np.float64)[:, None] + norms[None, :] - 2 * dot
+    np.maximum(distances, 0, out = distances)
+
+    return np.exp(-gamma * distances)
+
+def _pairwise_probability(decision: np.ndarray, prob_a: np.ndarray, prob_b: np.ndarray) -> np.ndarray:
+    """
+    Platt scaling of the decision values, as done by libsvm for the first class of each model.
+
+    Parameters:
+    - decision (np.ndarray): Decision values (sklearn sign convention), one column per model.
+    - prob_a (np.ndarray): The probA_ of every model.
+    - prob_b (np.ndarray): The probB_ of every model.
+
+    Returns:
+    - np.ndarray: Probability of the first class of every model.
+    """
+
+    # libsvm works with the opposite sign of sklearn for binary problems
+    f = -decision * prob_a + prob_b
+
+    # Numerically stable 1 / (1 + exp(f))
+    probability = 0.5 * (1 - np.tanh(0.5 * f))
+
+    return np.clip(probability, MIN_PROB, 1 - MIN_PROB)
+
+def _multiclass_probability(r: np.ndarray) -> np.ndarray:
+    """
+    Vectorised port of the libsvm multiclass_probability routine for two classes.
+
+    Parameters:
+    - r (np.ndarray): Pairwise probability of the first class.
+
+    Returns:
+    - np.ndarray: Coupled probability of the first class.
+    """
+
+    k = 2
+    eps = 0.005 / k
+    max_iter = max(100, k)
+
+    # Q matrix of the coupling problem: r[1][0] = 1 - r[0][1]
+    q = np.empty(r.shape + (k, k))
+    q[..., 0, 0] = (1 - r) ** 2
+    q[..., 1, 1] = r ** 2
+    q[..., 0, 1] = -(1 - r) * r
+    q[..., 1, 0] = q[..., 0, 1]
+
+    p = np.full(r.shape + (k,), 1 / k)
+    active = np.ones(r.shape, dtype = bool)
+
+    for _ in range(max_iter):
+        qp = np.einsum("...ij,...j->...i", q, p)
+        pqp = np.einsum("...i,...i->...", p, qp)
+
+        # Rows that already converged are not updated anymore
+        active &= np.max(np.abs(qp - pqp[..., None]), axis = -1) >= eps
+
+        if not active.any():
+            break
+
+        for t in range(k):
+            diff = np.where(active, (-qp[..., t] + pqp) / q[..., t, t], 0)
+
+            p[..., t] += diff
+            pqp = (pqp + diff * (diff * q[..., t, t] + 2 * qp[..., t])) / (1 + diff) / (1 + diff)
+
+            qp = (qp + diff[..., None] * q[..., t, :]) / (1 + diff[..., None])
+            p = p / (1 + diff[..., None])
+
+    return p[..., 0]
+
+class FusedSVC(object):
+
+    def __init__(self, *, labels: list[str], parameters: list[dict], coupled: bool = True) -> None:
+        """
+        Evaluate several binary SVC models sharing their support vectors in a single kernel pass.
+
+        Parameters:
+        - labels (list[str]): The label of every model.
+        - parameters (list[dict]): The parameters of every model, as returned by svc_parameters.
+        - coupled (bool): Whether probabilities go through the libsvm coupling step.
+        """
+
+        self.labels = labels
+        self.coupled = coupled
+        self.groups = [].copy()
+
+        # Models with the same kernel share the kernel computation
+        keys = {}
+
+        for x, p in enumerate(parameters):
+            key = (p["kernel"], float(p["gamma"]), float(p["coef0"]), int(p["degree"]))
+            keys.setdefault(key, []).append(x)
+
+        self.intercept = np.array([p["intercept"] for p in parameters], dtype = np.float64)
+        self.prob_a = np.array([p["prob_a"] for p in parameters], dtype = np.float64)
+        self.prob_b = np.array([p["prob_b"] for p in parameters], dtype = np.float64)
+        self.first = np.array([p["first"] for p in parameters], dtype = bool)
+
+        num_vectors = 0
+
+        for (kernel, gamma, coef0, degree), indices in keys.items():
+            if len(indices) == 1:
+                # Nothing to share, keep the support vectors as they are (e.g. memory-mapped)
+                vectors = parameters[indices[0]]["support_vectors"]
+                weights = np.asarray(parameters[indices[0]]["dual_coef"], dtype = np.float64)[:, None]
+
+            else:
+                # Deduplicate the support vectors of every model in the group
+                stacked = np.vstack([parameters[x]["support_vectors"] for x in indices])
+                vectors, inverse = np.unique(stacked, axis = 0, return_inverse = True)
+                inverse = inverse.ravel()
+
+                # Scatter the dual coefficients of every model into a single matrix
+                weights = np.zeros((len(vectors), len(indices)))
+                offset = 0
+
+                for column, x in enumerate(indices):
+                    coef = parameters[x]["dual_coef"]
+                    np.add.at(weights[:, column], inverse[offset: offset + len(coef)], coef)
+                    offset += len(coef)
+
+            num_vectors += sum(len(parameters[x]["support_vectors"]) for x in indices)
+
+            self.groups.append({
+                "kernel": kernel,
+                "gamma": gamma,
+                "coef0": coef0,
+                "degree": degree,
+                "indices": np.array(indices),
+                "vectors": vectors,
+                "norms": np.einsum("ij,ij->i", vectors, vectors, dtype = np.float64),
+                "weights": weights
+            })
+
+        self.num_vectors = num_vectors
+        self.num_unique_vectors = sum(len(g["vectors"]) for g in self.groups)
+
+    @classmethod
+    def from_models(cls, models: list, labels: list[str]):
+        """
+        Build a fused predictor from fitted SVC models.
+
+        Parameters:
+        - models (list): Tuples (model, index of the label that is not "other").
+        - labels (list[str]): The label of every model.
+
+        Returns:
+        - FusedSVC: The fused predictor, or None if a model is not supported.
+        """
+
+        parameters = [].copy()
+
+        for model, non_other_index in models:
+            p = svc_parameters(model, non_other_index)
+
+            if p is None:
+                return None
+
+            parameters.append(p)
+
+        return cls(labels = labels, parameters = parameters)
+
+    def decision_function(self, images) -> np.ndarray:
+        """
+        Compute the decision value of every model.
+
+        Parameters:
+        - images: Matrix with one flattened image per row.
+
+        Returns:
+        - np.ndarray: Matrix with one row per image and one column per model.
+        """
+
+        images = np.asarray(images)
+
+        results = np.empty((len(images), len(self.labels)))
+
+        for g in self.groups:
+            k = _kernel(images, g["vectors"], g["norms"], g["kernel"], g["gamma"], g["coef0"], g["degree"])
+            results[:, g["indices"]] = k @ g["weights"]
+
+        return results + self.intercept
+
+    def predict_proba(self, images) -> np.ndarray:
+        """
+        Compute the probability of every label for a batch of images.
+
+        Parameters:
+        - images: Matrix with one flattened image per row.
+
+        Returns:
+        - np.ndarray: Matrix with one row per image and one column per label.
+        """
+
+        probability = _pairwise_probability(self.decision_function(images), self.prob_a, self.prob_b)
+
+        if self.coupled:
+            probability = _multiclass_probability(probability)
+
+        # Probability of the label that is not "other"
+        return np.where(self.first, probability, 1 - probability)
+
+    def verify(self, models: list, images) -> bool:
+        """
+        Check the fused predictor against the original models, switching the probability coupling if needed.
+
+        Parameters:
+        - models (list): Tuples (model, index of the label that is not "other").
+        - images: Matrix with one flattened image per row.
+
+        Returns:
+        - bool: True if the fused predictor reproduces the original probabilities, False otherwise.
+        """
+
+        expected = np.column_stack([model.predict_proba(images)[:, index] for model, index in models])
+
+        for coupled in (self.coupled, not self.coupled):
+            self.coupled = coupled
+
+            if np.allclose(self.predict_proba(images), expected, rtol = 0, atol = 1e-5):
+                return True
+
+        return False
+
+def svc_parameters(model, non_other_index: int) -> dict:
+    """
+    Extract the parameters needed to evaluate a fitted binary SVC.
+
+    Parameters:
+    - model: The fitted model.
+    - non_other_index (int): Index of the label that is not "other".
+
+    Returns:
+    - dict: The parameters, or None if the model is not a supported SVC.
+    """
+
+    # Only binary SVC models with Platt scaling are supported
+    if not all(hasattr(model, a) for a in ("support_vectors_", "dual_coef_", "probA_", "probB_", "_gamma")):
+        return None
+
+    if len(model.classes_) != 2 or model.kernel not in ("linear", "poly", "rbf", "sigmoid") or len(model.probA_) != 1:
+        return None
+
+    return {
+        "kernel": model.kernel,
+        "gamma": model._gamma,
+        "coef0": model.coef0,
+        "degree": model.degree,
+        "support_vectors": model.support_vectors_,
+        "dual_coef": np.asarray(model.dual_coef_[0], dtype = np.float64),
+        "intercept": float(model.intercept_[0]),
+        "prob_a": float(model.probA_[0]),
+        "prob_b": float(model.probB_[0]),
+        "first": non_other_index == 0
+    }
@@ -0,0 +1,192 @@
+import math
+import time
+import hashlib
+import numpy as np
+from sklearn.svm import SVC
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from sklearn.metrics.pairwise import linear_kernel, polynomial_kernel, rbf_kernel, sigmoid_kernel
+
+def data_signature(images: np.ndarray, labels) -> str:
+    """
+    Compute a hash identifying a training set.
+
+    Parameters:
+    - images (np.ndarray): Matrix with one flattened image per row.
+    - labels: The label of every image.
+
+    Returns:
+    - str: The hexadecimal SHA-1 of the images and labels.
+    """
+
+    h = hashlib.sha1()
+    h.update(str(images.shape).encode("utf-8"))
+
+    for start in range(0, len(images), 1024):
+        h.update(np.ascontiguousarray(images[start: start + 1024]).tobytes())
+
+    h.update("\n".join(str(x) for x in labels).encode("utf-8"))
+
+    return h.hexdigest()
+
+def _gamma(params: dict, images: np.ndarray) -> float:
+    """
+    Resolve the gamma of a candidate the same way SVC does.
+
+    Parameters:
+    - params (dict): The candidate parameters.
+    - images (np.ndarray): The float64 training images.
+
+    Returns:
+    - float: The kernel coefficient.
+    """
+
+    gamma = params.get("gamma", "scale")
+
+    if gamma == "scale":
+        return 1 / (images.shape[1] * images.var())
+
+    if gamma == "auto":
+        return 1 / images.shape[1]
+
+    return float(gamma)
+
+def gram_matrix(images: np.ndarray, params: dict) -> np.ndarray:
+    """
+    Compute the kernel matrix of a set of images for a candidate.
+
+    Parameters:
+    - images (np.ndarray): The float64 training images.
+    - params (dict): The candidate parameters (kernel, gamma, degree, coef0).
+
+    Returns:
+    - np.ndarray: The kernel between every pair of images.
+    """
+
+    kernel = params.get("kernel", "rbf")
+    gamma = _gamma(params, images)
+
+    if kernel == "linear":
+        return linear_kernel(images)
+
+    if kernel == "poly":
+        return polynomial_kernel(images, degree = params.get("degree", 3), gamma = gamma, coef0 = params.get("coef0", 0.0))
+
+    if kernel == "sigmoid":
+        return sigmoid_kernel(images, gamma = gamma, coef0 = params.get("coef0", 0.0))
+
+    return rbf_kernel(images, gamma = gamma)
+
+def _kernel_key(params: dict) -> tuple:
+    """
+    Get the parameters that define the kernel matrix of a candidate, the rest (e.g. C) only affect the solver.
+
+    Parameters:
+    - params (dict): The candidate parameters.
+
+    Returns:
+    - tuple: The kernel parameters.
+    """
+
+    kernel = params.get("kernel", "rbf")
+
+    if kernel == "linear":
+        return (kernel, )
+
+    return (kernel, str(params.get("gamma", "scale")), params.get("degree", 3) if kernel == "poly" else None, params.get("coef0", 0.0))
+
+def _evaluate(images: np.ndarray, labels: np.ndarray, candidates: list, cv: int, random_state: int) -> list:
+    """
+    Score every candidate with cross validation, computing one kernel matrix per kernel configuration.
+
+    Parameters:
+    - images (np.ndarray): The training images.
+    - labels (np.ndarray): The label of every image.
+    - candidates (list): The candidate parameters.
+    - cv (int): Number of folds.
+    - random_state (int): Seed of the folds.
+
+    Returns:
+    - list: One result (params, score, seconds) per candidate, in the same order.
+    """
+
+    images = np.asarray(images, dtype = np.float64)
+    folds = list(StratifiedKFold(n_splits = cv, shuffle = True, random_state = random_state).split(images, labels))
+
+    groups = {}
+
+    for x, params in enumerate(candidates):
+        groups.setdefault(_kernel_key(params), []).append(x)
+
+    results = [None] * len(candidates)
+
+    for indices in groups.values():
+        time_start = time.time()
+
+        # The kernel matrix is shared by every C value of the group
+        gram = gram_matrix(images, candidates[indices[0]])
+        gram_seconds = (time.time() - time_start) / len(indices)
+
+        for x in indices:
+            params = candidates[x]
+            solver = {k: v for k, v in params.items() if k not in ("kernel", "gamma", "degree", "coef0")}
+
+            time_start = time.time()
+            scores = [].copy()
+
+            for train, test in folds:
+                model = SVC(kernel = "precomputed", **solver)
+                model.fit(gram[np.ix_(train, train)], labels[train])
+                scores.append(float((model.predict(gram[np.ix_(test, train)]) == labels[test]).mean()))
+
+            results[x] = {"params": params, "score": float(np.mean(scores)), "seconds": gram_seconds + time.time() - time_start}
+
+    return results
+
+def successive_halving(images: np.ndarray, labels, grid: dict, *, min_samples: int = 100, factor: int = 3, cv: int = 3, random_state: int = 0) -> dict:
+    """
+    Search the best SVC parameters evaluating every candidate on a small sample and only the best ones on larger samples.
+
+    Parameters:
+    - images (np.ndarray): Matrix with one flattened image per row.
+    - labels: The label of every image.
+    - grid (dict): The parameter grid, as used by GridSearchCV.
+    - min_samples (int): Number of images of the first round.
+    - factor (int): Ratio between the samples of two rounds, and between the candidates of two rounds.
+    - cv (int): Number of cross validation folds.
+    - random_state (int): Seed of the sampling and of the folds.
+
+    Returns:
+    - dict: The best parameters and score, and the candidates and timings of every round.
+    """
+
+    labels = np.asarray(labels)
+    candidates = list(ParameterGrid(grid))
+
+    # Every round uses a prefix of the same permutation, so the samples are nested
+    order = np.random.default_rng(random_state).permutation(len(images))
+
+    rounds = [].copy()
+    time_start = time.time()
+
+    for r in range(len(candidates)):
+        size = min(len(images), min_samples * factor ** r)
+        sample = np.sort(order[: size])
+
+        round_start = time.time()
+        results = sorted(_evaluate(images[sample], labels[sample], candidates, cv, random_state), key = lambda x: -x["score"])
+
+        rounds.append({"samples": int(size), "seconds": time.time() - round_start, "candidates": results})
+
+        print(f"[INFO] Successive halving round {r + 1}: {len(candidates)} candidates on {size} images, best {results[0]['params']} with score {results[0]['score']}")
+
+        if len(results) == 1 or size == len(images):
+            break
+
+        candidates = [x["params"] for x in results[: max(1, math.ceil(len(results) / factor))]]
+
+    return {
+        "best_params": results[0]["params"],
+        "best_score": results[0]["score"],
+        "seconds": time.time() - time_start,
+        "rounds": rounds
+    }
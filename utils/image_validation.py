@@ -0,0 +1,138 @@
+import cv2 as cv
+import numpy as np
+from process_pool import pool_map
+from content_cache import ContentCache
+
+def scan_offset(data: bytes) -> int:
+    """
+    Find the first start of scan marker of a JPEG image, skipping the segments before it (e.g. an EXIF thumbnail).
+
+    Parameters:
+    - data (bytes): The encoded image.
+
+    Returns:
+    - int: The offset of the marker, None if the header is malformed or ends before it.
+    """
+
+    x = 2
+
+    while x + 4 <= len(data):
+        if data[x] != 0xFF:
+            return None
+
+        marker = data[x + 1]
+
+        # Fill bytes and markers without payload
+        if marker == 0xFF:
+            x += 1
+            continue
+
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            x += 2
+            continue
+
+        if marker == 0xDA:
+            return x
+
+        x += 2 + int.from_bytes(data[x + 2: x + 4], "big")
+
+    return None
+
+def validate_image(path: str, min_size: tuple, channels: list[int]) -> dict:
+    """
+    Check that an image can be used for training: complete, decodable, large enough and with the expected channels.
+
+    Parameters:
+    - path (str): The path to the image.
+    - min_size (tuple): Minimum (width, height).
+    - channels (list[int]): The accepted numbers of channels.
+
+    Returns:
+    - dict: The verdict, whether the image is valid, the reason when it is not, and its width, height and channels.
+    """
+
+    verdict = {"valid": False, "reason": None, "width": None, "height": None, "channels": None}
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    # A truncated JPEG usually decodes with grey blocks instead of failing, so its end of image marker is checked.
+    # Markers are never found inside the compressed data, and anything may be appended after the marker.
+    if data[: 2] == b"\xff\xd8":
+        offset = scan_offset(data)
+
+        if offset is None or data.rfind(b"\xff\xd9") < offset:
+            verdict["reason"] = "truncated"
+            return verdict
+
+    # The channels stored in the file, the training decoding converts grayscale images to BGR
+    image = cv.imdecode(np.frombuffer(data, dtype = np.uint8), cv.IMREAD_UNCHANGED)
+
+    if image is None:
+        verdict["reason"] = "undecodable"
+        return verdict
+
+    verdict["height"], verdict["width"] = image.shape[: 2]
+    verdict["channels"] = 1 if image.ndim == 2 else image.shape[2]
+
+    if verdict["width"] < min_size[0] or verdict["height"] < min_size[1]:
+        verdict["reason"] = "too_small"
+
+    elif verdict["channels"] not in channels:
+        verdict["reason"] = "channels"
+
+    else:
+        verdict["valid"] = True
+
+    return verdict
+
+def _validate_chunk(paths: list[str], min_size: tuple, channels: list[int]) -> list[dict]:
+    """
+    Validate several images in a worker process.
+
+    Parameters:
+    - paths (list[str]): The paths to the images.
+    - min_size (tuple): Minimum (width, height).
+    - channels (list[int]): The accepted numbers of channels.
+
+    Returns:
+    - list[dict]: The verdicts.
+    """
+
+    return [validate_image(x, min_size, channels) for x in paths]
+
+def validate_files(paths: list[str], min_size: tuple, channels: list[int], workers: int = None) -> list[dict]:
+    """
+    Validate several images in a pool of worker processes.
+
+    Parameters:
+    - paths (list[str]): The paths to the images.
+    - min_size (tuple): Minimum (width, height).
+    - channels (list[int]): The accepted numbers of channels.
+    - workers (int): Number of worker processes, None to use every CPU.
+
+    Returns:
+    - list[dict]: The verdicts in the same order.
+    """
+
+    return pool_map(_validate_chunk, paths, (min_size, channels), workers, "Validated")
+
+class VerdictCache(ContentCache):
+    def __init__(self, path: str, min_size: tuple, channels: list[int]) -> None:
+        """
+        Initialize a persistent cache of validation verdicts keyed by the content hash of the files.
+
+        Parameters:
+        - path (str): The JSON file of the cache, loaded if it exists with the same settings.
+        - min_size (tuple): Minimum (width, height).
+        - channels (list[int]): The accepted numbers of channels.
+        """
+
+        super().__init__(path, {"min_size": list(min_size), "channels": list(channels)})
+
+    def compute(self, paths: list[str], workers: int = None) -> list:
+        """
+        Validate several images, see ContentCache.compute.
+        """
+
+        return validate_files(paths, tuple(self.settings["min_size"]), self.settings["channels"], workers)
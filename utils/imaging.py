@@ -0,0 +1,132 @@
+import cv2 as cv
+import numpy as np
+
+# Size of the images used by the models, shared by training and serving
+IMAGE_SIZE = (50, 50)
+
+# Decode-time downscaling supported by libjpeg (DCT scaling)
+REDUCED_FLAGS = {
+    8: cv.IMREAD_REDUCED_COLOR_8,
+    4: cv.IMREAD_REDUCED_COLOR_4,
+    2: cv.IMREAD_REDUCED_COLOR_2
+}
+
+def jpeg_size(data: bytes) -> tuple:
+    """
+    Read the dimensions of a JPEG image from its header, without decoding it.
+
+    Parameters:
+    - data (bytes): The encoded image.
+
+    Returns:
+    - tuple: (width, height), or None if the data is not a JPEG image or the header is malformed.
+    """
+
+    if data[: 2] != b"\xff\xd8":
+        return None
+
+    x = 2
+
+    while x + 9 < len(data):
+        if data[x] != 0xFF:
+            return None
+
+        marker = data[x + 1]
+
+        # Fill bytes and markers without payload
+        if marker == 0xFF:
+            x += 1
+            continue
+
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            x += 2
+            continue
+
+        length = int.from_bytes(data[x + 2: x + 4], "big")
+
+        # Start of frame markers, except DHT, JPG and DAC
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = int.from_bytes(data[x + 5: x + 7], "big")
+            width = int.from_bytes(data[x + 7: x + 9], "big")
+
+            return (width, height) if width > 0 and height > 0 else None
+
+        # Start of scan reached without a frame header
+        if marker == 0xDA:
+            return None
+
+        x += 2 + length
+
+    return None
+
+def reduction_factor(width: int, height: int, size: tuple = IMAGE_SIZE) -> int:
+    """
+    Get the largest decode-time reduction that still covers the target size.
+
+    Parameters:
+    - width (int): Width of the encoded image.
+    - height (int): Height of the encoded image.
+    - size (tuple): Target (width, height).
+
+    Returns:
+    - int: 8, 4, 2 or 1 if the image can not be reduced.
+    """
+
+    for factor in sorted(REDUCED_FLAGS.keys(), reverse = True):
+        # libjpeg rounds the scaled dimensions up
+        if -(-width // factor) >= size[0] and -(-height // factor) >= size[1]:
+            return factor
+
+    return 1
+
+def decode(data: bytes, size: tuple = IMAGE_SIZE) -> np.ndarray:
+    """
+    Decode an image, downscaling JPEG images while decoding when they are larger than needed.
+
+    Parameters:
+    - data (bytes): The encoded image.
+    - size (tuple): Target (width, height) the image will be resized to.
+
+    Returns:
+    - np.ndarray: The decoded BGR image, or None if it can not be decoded.
+    """
+
+    buffer = np.frombuffer(data, dtype = np.uint8)
+    dimensions = jpeg_size(data)
+
+    if dimensions is not None:
+        factor = reduction_factor(dimensions[0], dimensions[1], size)
+
+        if factor > 1:
+            image = cv.imdecode(buffer, REDUCED_FLAGS[factor])
+
+            if image is not None:
+                return image
+
+    # Anything else goes through the full decoding
+    return cv.imdecode(buffer, cv.IMREAD_COLOR)
+
+def load_image(source, size: tuple = IMAGE_SIZE) -> np.ndarray:
+    """
+    Load an encoded image as the flattened vector used by the models.
+
+    Training and serving must both use this function so they produce identical vectors for the same file.
+
+    Parameters:
+    - source: A file path or the encoded bytes.
+    - size (tuple): Target (width, height).
+
+    Returns:
+    - np.ndarray: The flattened BGR image, or None if it can not be decoded.
+    """
+
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            source = f.read()
+
+    image = decode(source, size)
+
+    if image is None:
+        return None
+
+    return cv.resize(image, size).flatten()
@@ -0,0 +1,268 @@
+import os
+import time
+import threading
+import cv2 as cv
+import numpy as np
+from registry import ModelRegistry
+from batching import MicroBatcher
+from prediction_cache import PredictionCache, digest
+from imaging import IMAGE_SIZE, decode
+from metrics import METRICS, REQUESTS, IMAGES, IN_FLIGHT, REQUEST_SECONDS, STAGE_SECONDS, BATCH_SIZE
+
+def read(image):
+    """
+    Read the raw bytes of an input image given as a file path.
+
+    Parameters:
+    - image: A file path, encoded bytes or a decoded RGB image.
+
+    Returns:
+    - The encoded bytes, or the image itself if it is already decoded.
+    """
+
+    if isinstance(image, str):
+        with open(image, "rb") as f:
+            return f.read()
+
+    return image
+
+def prepare(image) -> np.ndarray:
+    """
+    Convert an input image to the flattened vector used by the models.
+
+    Parameters:
+    - image: Encoded bytes or a decoded RGB image.
+
+    Returns:
+    - np.ndarray: The flattened 50x50 BGR image.
+    """
+
+    if isinstance(image, bytes):
+        # Encoded image, decoded the same way as the training images (see load_image)
+        with STAGE_SECONDS.time("decode"):
+            image = decode(image)
+
+        if image is None:
+            raise ValueError("Unable to decode the image")
+    else:
+        with STAGE_SECONDS.time("convert"):
+            image = np.array(image)
+
+        with STAGE_SECONDS.time("cvtColor"):
+            image = cv.cvtColor(image, cv.COLOR_RGB2BGR)
+
+    with STAGE_SECONDS.time("resize"):
+        image = cv.resize(image, IMAGE_SIZE)
+
+    with STAGE_SECONDS.time("flatten"):
+        return image.flatten()
+
+class Inference(object):
+
+    def __init__(self, *, models_path: str, models_suffix: str, reload_interval: float = 5, fused: bool = False, batch_size: int = 32, batch_delay: float = 0.005, cache_size: int = 4096, cache_ttl: float = 3600) -> None:
+        """
+        Classify images with the models of a directory, batching and caching the predictions.
+
+        Parameters:
+        - models_path (str): The models directory.
+        - models_suffix (str): Only files ending with this suffix are loaded.
+        - reload_interval (float): Seconds between checks of the models directory.
+        - fused (bool): Whether to evaluate all the models in a single kernel pass when possible.
+        - batch_size (int): Maximum number of images per batch.
+        - batch_delay (float): Maximum seconds to wait for more images once the first one arrives.
+        - cache_size (int): Maximum number of entries of each cache level.
+        - cache_ttl (float): Seconds a cached prediction stays valid.
+        """
+
+        self.models_path = models_path
+        self.models_suffix = models_suffix
+        self.reload_interval = reload_interval
+        self.fused = fused
+
+        self.batcher = MicroBatcher(predict = self.predict, max_batch_size = batch_size, max_delay = batch_delay)
+        self.cache = PredictionCache(max_entries = cache_size, ttl = cache_ttl)
+
+        self._registry = None
+        self._lock = threading.Lock()
+
+        # Export the cache counters with the rest of the metrics
+        METRICS.callback("ceres_cache_hits_total", "Prediction cache hits", ("level",), "counter", lambda: self._cache_stats("hits"))
+        METRICS.callback("ceres_cache_misses_total", "Prediction cache misses", ("level",), "counter", lambda: self._cache_stats("misses"))
+        METRICS.callback("ceres_cache_entries", "Prediction cache entries", ("level",), "gauge", lambda: self._cache_stats("entries"))
+
+    def _cache_stats(self, counter: str) -> dict:
+        """
+        Get a counter of both cache levels.
+
+        Parameters:
+        - counter (str): Either hits, misses or entries.
+
+        Returns:
+        - dict: The counter of every level.
+        """
+
+        stats = self.cache.stats()
+
+        return {("images", ): stats["images"][counter], ("features", ): stats["features"][counter]}
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the inference service from the project configuration.
+
+        Parameters:
+        - config: The config module.
+
+        Returns:
+        - Inference: The inference service.
+        """
+
+        return cls(
+            models_path = os.path.join(config.model["path"], config.model["path_models"]),
+            models_suffix = config.model["compact_name"] if config.model["compact"] else config.model["name"],
+            reload_interval = config.model["reload_interval"],
+            fused = config.model["fused"],
+            batch_size = config.server["batch_size"],
+            batch_delay = config.server["batch_delay"],
+            cache_size = config.server["cache_size"],
+            cache_ttl = config.server["cache_ttl"]
+        )
+
+    @property
+    def registry(self) -> ModelRegistry:
+        """
+        The model registry, loading the models the first time it is used.
+        """
+
+        with self._lock:
+            if self._registry is None:
+                self._registry = ModelRegistry(path = self.models_path, suffix = self.models_suffix, interval = self.reload_interval, fused = self.fused)
+
+        return self._registry
+
+    def start(self) -> None:
+        """
+        Load the models and start watching for new versions.
+        """
+
+        self.registry.start()
+
+    def warm_up(self, images: list) -> None:
+        """
+        Run the models once so the first request does not pay the lazy initialisations of NumPy, OpenCV and sklearn.
+
+        Parameters:
+        - images (list): File paths, encoded bytes or decoded RGB images.
+        """
+
+        if len(images) == 0:
+            return
+
+        time_start = time.time()
+
+        self.classify(images)
+
+        print(f"[INFO] Warm-up with {len(images)} images has successfully finished in {time.time() - time_start} seconds")
+
+    def predict(self, images: np.ndarray) -> list:
+        """
+        Run the models on a matrix with one prepared image per row.
+
+        Parameters:
+        - images (np.ndarray): Matrix with one prepared image per row.
+
+        Returns:
+        - list: Probability of every label for each image.
+        """
+
+        BATCH_SIZE.observe(len(images))
+
+        # Use the same models for the whole batch even if they are reloaded meanwhile
+        models = self.registry.get()
+
+        # Make predictions using the models
+        results = models.predict_proba(images)
+
+        return [{label: float(result) for label, result in zip(models.labels, row)} for row in results]
+
+    def classify(self, images: list) -> list:
+        """
+        Run the models on a list of input images, recording the request metrics.
+
+        Parameters:
+        - images (list): File paths, encoded bytes or decoded RGB images.
+
+        Returns:
+        - list: Probability of every label for each image.
+        """
+
+        if not METRICS.enabled:
+            return self._classify(images)
+
+        IN_FLIGHT.inc()
+
+        try:
+            with REQUEST_SECONDS.time():
+                results = self._classify(images)
+
+        except Exception:
+            REQUESTS.inc("error")
+            raise
+
+        finally:
+            IN_FLIGHT.dec()
+
+        REQUESTS.inc("ok")
+        IMAGES.inc(value = len(images))
+
+        return results
+
+    def _classify(self, images: list) -> list:
+        """
+        Run the models on a list of input images, reusing cached predictions of repeated images.
+
+        Parameters:
+        - images (list): File paths, encoded bytes or decoded RGB images.
+
+        Returns:
+        - list: Probability of every label for each image.
+        """
+
+        cache = self.cache
+        version = self.registry.get().version
+
+        results = [None] * len(images)
+        pending = [].copy()
+
+        for x, image in enumerate(images):
+            image = read(image)
+
+            # Same uploaded bytes
+            image_key = digest(image) if isinstance(image, bytes) else None
+            data = cache.get(cache.images, image_key, version)
+
+            if data is not None:
+                results[x] = dict(data)
+                continue
+
+            # Same prepared image
+            image = prepare(image)
+            features_key = digest(image)
+            data = cache.get(cache.features, features_key, version)
+
+            if data is not None:
+                cache.put(cache.images, image_key, version, data)
+                results[x] = dict(data)
+                continue
+
+            # Queue the image so the whole list is predicted in as few batches as possible
+            pending.append((x, image_key, features_key, self.batcher.submit(image)))
+
+        for x, image_key, features_key, future in pending:
+            data = future.result()
+
+            cache.put(cache.features, features_key, version, data)
+            cache.put(cache.images, image_key, version, data)
+            results[x] = dict(data)
+
+        return results
@@ -0,0 +1,99 @@
+import os
+import resource
+from contextlib import contextmanager
+
+def _mib(size: int) -> float:
+    """
+    Convert bytes to mebibytes.
+
+    Parameters:
+    - size (int): Size in bytes.
+
+    Returns:
+    - float: Size in MiB.
+    """
+
+    return round(size / (1024 * 1024), 1)
+
+def peak_rss() -> int:
+    """
+    Get the peak resident memory of the process.
+
+    Returns:
+    - int: Peak RSS in bytes.
+    """
+
+    # Linux reports kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def current_rss() -> int:
+    """
+    Get the current resident memory of the process.
+
+    Returns:
+    - int: RSS in bytes, the peak RSS if it can not be read.
+    """
+
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    except (OSError, ValueError):
+        return peak_rss()
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak resident memory of the process, so the next reading only covers what follows.
+
+    Returns:
+    - bool: True if the peak was reset (Linux 4.0 or later).
+    """
+
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+
+        return True
+
+    except OSError:
+        return False
+
+@contextmanager
+def memory_phase(name: str):
+    """
+    Log the peak resident memory reached during a block of code.
+
+    Parameters:
+    - name (str): The name of the phase.
+    """
+
+    reset = reset_peak_rss()
+    rss_start = current_rss()
+
+    try:
+        yield
+
+    finally:
+        scope = "phase" if reset else "process"
+
+        print(f"[INFO] Memory {name}: peak RSS {_mib(peak_rss())} MiB ({scope}), RSS {_mib(rss_start)} -> {_mib(current_rss())} MiB")
+
+def chunk_rows(row_bytes: int, budget: int = None, count: int = None) -> int:
+    """
+    Get the number of rows that can be processed at once within a memory budget.
+
+    Parameters:
+    - row_bytes (int): Memory needed by every row.
+    - budget (int): Memory budget in bytes, None for no limit.
+    - count (int): Total number of rows.
+
+    Returns:
+    - int: Rows per chunk, at least one.
+    """
+
+    if budget is None:
+        return max(1, count or 1)
+
+    rows = max(1, budget // max(1, row_bytes))
+
+    return min(rows, count) if count else rows
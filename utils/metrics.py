@@ -0,0 +1,350 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Context returned by the timers when the metrics are disabled
+NULL_CONTEXT = nullcontext()
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _labels(names: tuple, values: tuple, extra: str = None) -> str:
+    """
+    Format the labels of a sample in the Prometheus text format.
+
+    Parameters:
+    - names (tuple): The label names.
+    - values (tuple): The label values.
+    - extra (str): An already formatted label appended at the end.
+
+    Returns:
+    - str: The formatted labels, empty if there are none.
+    """
+
+    items = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+
+    if extra is not None:
+        items.append(extra)
+
+    return "{" + ",".join(items) + "}" if len(items) > 0 else ""
+
+class Metric(object):
+
+    def __init__(self, metrics, name: str, help: str, labels: tuple = ()) -> None:
+        """
+        Base class of the metrics.
+
+        Parameters:
+        - metrics (Metrics): The registry the metric belongs to.
+        - name (str): The metric name.
+        - help (str): The metric description.
+        - labels (tuple): The label names.
+        """
+
+        self.metrics = metrics
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+        self._values = {}
+        self._lock = threading.Lock()
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, value: float = 1) -> None:
+        """
+        Increase the counter.
+
+        Parameters:
+        - *labels: The label values.
+        - value (float): The amount to add.
+        """
+
+        if not self.metrics.enabled:
+            return
+
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def samples(self) -> list:
+        """
+        Get the exported samples.
+
+        Returns:
+        - list: Tuples (name, labels, value).
+        """
+
+        with self._lock:
+            return [(self.name, _labels(self.labels, k), v) for k, v in self._values.items()]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels, value: float = 1) -> None:
+        """
+        Decrease the gauge.
+
+        Parameters:
+        - *labels: The label values.
+        - value (float): The amount to subtract.
+        """
+
+        self.inc(*labels, value = -value)
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, metrics, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> None:
+        """
+        Distribution of observed values.
+
+        Parameters:
+        - metrics (Metrics): The registry the metric belongs to.
+        - name (str): The metric name.
+        - help (str): The metric description.
+        - labels (tuple): The label names.
+        - buckets (tuple): Upper bounds of the buckets.
+        """
+
+        super().__init__(metrics, name, help, labels)
+
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels) -> None:
+        """
+        Record a value.
+
+        Parameters:
+        - value (float): The observed value.
+        - *labels: The label values.
+        """
+
+        if not self.metrics.enabled:
+            return
+
+        with self._lock:
+            values = self._values.get(labels)
+
+            if values is None:
+                values = self._values[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+
+            values[0][bisect.bisect_left(self.buckets, value)] += 1
+            values[1] += value
+            values[2] += 1
+
+    def time(self, *labels):
+        """
+        Measure the duration of a block of code.
+
+        Parameters:
+        - *labels: The label values.
+
+        Returns:
+        - A context manager recording the duration of the block.
+        """
+
+        if not self.metrics.enabled:
+            return NULL_CONTEXT
+
+        return self._time(labels)
+
+    @contextmanager
+    def _time(self, labels: tuple):
+        """
+        Record the duration of the block using the context manager.
+
+        Parameters:
+        - labels (tuple): The label values.
+        """
+
+        time_start = time.perf_counter()
+
+        try:
+            yield
+
+        finally:
+            self.observe(time.perf_counter() - time_start, *labels)
+
+    def samples(self) -> list:
+        """
+        Get the exported samples, with cumulative buckets.
+
+        Returns:
+        - list: Tuples (name, labels, value).
+        """
+
+        samples = [].copy()
+
+        with self._lock:
+            for k, (counts, total, count) in self._values.items():
+                cumulative = 0
+
+                for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    samples.append((self.name + "_bucket", _labels(self.labels, k, f'le="{le}"'), cumulative))
+
+                samples.append((self.name + "_sum", _labels(self.labels, k), total))
+                samples.append((self.name + "_count", _labels(self.labels, k), count))
+
+        return samples
+
+class Callback(Metric):
+
+    def __init__(self, metrics, name: str, help: str, labels: tuple = (), type: str = "gauge", func = None) -> None:
+        """
+        Metric whose values are read from a function when they are exported.
+
+        Parameters:
+        - metrics (Metrics): The registry the metric belongs to.
+        - name (str): The metric name.
+        - help (str): The metric description.
+        - labels (tuple): The label names.
+        - type (str): The Prometheus type of the metric.
+        - func (callable): Function returning a dict of label values tuples to values.
+        """
+
+        super().__init__(metrics, name, help, labels)
+
+        self.type = type
+        self.func = func
+
+    def samples(self) -> list:
+        """
+        Get the exported samples from the function.
+
+        Returns:
+        - list: Tuples (name, labels, value).
+        """
+
+        return [(self.name, _labels(self.labels, k), v) for k, v in self.func().items()]
+
+class Metrics(object):
+
+    def __init__(self, enabled: bool = False) -> None:
+        """
+        Registry of the metrics exported in the Prometheus text format.
+
+        Parameters:
+        - enabled (bool): Whether values are recorded, disabled metrics cost a single attribute check.
+        """
+
+        self.enabled = enabled
+        self.metrics = {}
+
+    def _add(self, metric: Metric) -> Metric:
+        """
+        Register a metric, returning the existing one if the name is already registered.
+
+        Parameters:
+        - metric (Metric): The metric.
+
+        Returns:
+        - Metric: The registered metric.
+        """
+
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        """
+        Register a counter.
+        """
+
+        return self._add(Counter(self, name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple = ()) -> Gauge:
+        """
+        Register a gauge.
+        """
+
+        return self._add(Gauge(self, name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        """
+        Register a histogram.
+        """
+
+        return self._add(Histogram(self, name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, labels: tuple = (), type: str = "gauge", func = None) -> Callback:
+        """
+        Register a metric read from a function, replacing any previous one with the same name.
+        """
+
+        metric = Callback(self, name, help, labels, type, func)
+        self.metrics[name] = metric
+
+        return metric
+
+    def render(self) -> str:
+        """
+        Export every metric in the Prometheus text format.
+
+        Returns:
+        - str: The exported metrics.
+        """
+
+        lines = [].copy()
+
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """
+        Serve the metrics on /metrics from a background thread.
+
+        Parameters:
+        - port (int): The port to listen on.
+        - host (str): The address to listen on.
+
+        Returns:
+        - ThreadingHTTPServer: The running server.
+        """
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = metrics.render().encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+
+        threading.Thread(target = server.serve_forever, name = "metrics", daemon = True).start()
+
+        print(f"[INFO] Serving metrics on {host}:{port}/metrics")
+
+        return server
+
+# Metrics of the inference service
+METRICS = Metrics()
+
+REQUESTS = METRICS.counter("ceres_requests_total", "Classification requests", ("status",))
+IMAGES = METRICS.counter("ceres_images_total", "Classified images")
+IN_FLIGHT = METRICS.gauge("ceres_requests_in_flight", "Classification requests being processed")
+REQUEST_SECONDS = METRICS.histogram("ceres_request_seconds", "Latency of the classification requests")
+STAGE_SECONDS = METRICS.histogram("ceres_stage_seconds", "Latency of every preprocessing stage", ("stage",))
+MODEL_SECONDS = METRICS.histogram("ceres_model_seconds", "Latency of every model on a batch", ("model",))
+BATCH_SIZE = METRICS.histogram("ceres_batch_size", "Images per prediction batch", buckets = (1, 2, 4, 8, 16, 32, 64, 128))
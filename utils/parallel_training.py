@@ -0,0 +1,96 @@
+import os
+import time
+import numpy as np
+import concurrent.futures
+from multiprocessing import shared_memory
+
+def _fit(shm_name: str, shape: tuple, dtype: str, labels: np.ndarray, class_name: str, model):
+    """
+    Fit a one-vs-rest model on the shared training matrix (run in a worker process).
+
+    Parameters:
+    - shm_name (str): The name of the shared memory block.
+    - shape (tuple): The shape of the shared matrix.
+    - dtype (str): The type of the shared matrix.
+    - labels (np.ndarray): The class of every row.
+    - class_name (str): The class the model identifies, every other class is labelled "other".
+    - model: The unfitted model.
+
+    Returns:
+    - tuple: The fitted model and the training time in seconds.
+    """
+
+    shm = shared_memory.SharedMemory(name = shm_name)
+
+    try:
+        images = np.ndarray(shape, dtype = dtype, buffer = shm.buf)
+        images.flags.writeable = False
+
+        time_start = time.time()
+
+        model.fit(images, np.where(labels == class_name, class_name, "other"))
+
+        del images
+
+        return model, time.time() - time_start
+
+    finally:
+        shm.close()
+
+def fit_parallel(*, images: dict, models: dict, workers: int = None) -> dict:
+    """
+    Fit one model per class at the same time over a single read-only training matrix.
+
+    Parameters:
+    - images (dict): Flattened uint8 images (or features) of every class.
+    - models (dict): Unfitted model of every class.
+    - workers (int): Maximum number of worker processes, None to use one per model.
+
+    Returns:
+    - dict: Fitted model of every class. Raises the error of the first model that fails.
+    """
+
+    count = sum(len(x) for x in images.values())
+    length = next(iter(images.values())).shape[1]
+    dtype = np.result_type(*images.values())
+    shape = (count, length)
+
+    time_start = time.time()
+
+    # Load the training matrix once, every worker maps the same pages
+    shm = shared_memory.SharedMemory(create = True, size = max(1, count * length * dtype.itemsize))
+
+    try:
+        matrix = np.ndarray(shape, dtype = dtype, buffer = shm.buf)
+        labels = np.empty(count, dtype = object)
+        offset = 0
+
+        for class_name, x in images.items():
+            matrix[offset: offset + len(x)] = x
+            labels[offset: offset + len(x)] = class_name
+            offset += len(x)
+
+        del matrix
+
+        labels = labels.astype(str)
+        workers = min(len(models), workers or len(models), os.cpu_count())
+
+        print(f"[INFO] Training {len(models)} models in parallel on {count} images with {workers} workers")
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+            futures = {class_name: executor.submit(_fit, shm.name, shape, dtype.str, labels, class_name, model) for class_name, model in models.items()}
+
+            fitted = {}
+
+            for class_name, future in futures.items():
+                fitted[class_name], duration = future.result()
+
+                print(f"[INFO] Model for {class_name} trained in {duration} seconds")
+
+    finally:
+        shm.close()
+        shm.unlink()
+
+    print(f"[INFO] Training {len(models)} models in parallel has successfully finished in {time.time() - time_start} seconds")
+
+    return fitted
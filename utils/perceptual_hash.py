@@ -0,0 +1,184 @@
+import cv2 as cv
+import numpy as np
+from imaging import decode
+from process_pool import pool_map
+from content_cache import ContentCache
+
+# Hash methods, both produce 64 bit hashes
+METHODS = ("dhash", "phash")
+
+def image_hash(path: str, method: str = "dhash") -> int:
+    """
+    Compute the perceptual hash of an image, similar images have hashes with a small Hamming distance.
+
+    dHash compares the brightness of adjacent pixels of a 9x8 thumbnail, pHash compares the low
+    frequencies of the DCT of a 32x32 thumbnail with their median.
+
+    Parameters:
+    - path (str): The path to the image.
+    - method (str): "dhash" or "phash".
+
+    Returns:
+    - int: The 64 bit hash, or None if the image can not be decoded.
+    """
+
+    with open(path, "rb") as f:
+        image = decode(f.read(), (32, 32))
+
+    if image is None:
+        return None
+
+    gray = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+
+    if method == "dhash":
+        thumbnail = cv.resize(gray, (9, 8), interpolation = cv.INTER_AREA).astype(np.int16)
+        bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+
+    elif method == "phash":
+        thumbnail = cv.resize(gray, (32, 32), interpolation = cv.INTER_AREA).astype(np.float32)
+        low = cv.dct(thumbnail)[:8, :8].flatten()
+
+        # The DC coefficient only depends on the average brightness
+        bits = low > np.median(low[1:])
+
+    else:
+        raise ValueError(f"Unknown perceptual hash method {method}, expected one of {METHODS}")
+
+    return int("".join("1" if x else "0" for x in bits.flatten()), 2)
+
+def _hash_chunk(paths: list[str], method: str) -> list:
+    """
+    Compute the perceptual hashes of several images in a worker process.
+
+    Parameters:
+    - paths (list[str]): The paths to the images.
+    - method (str): "dhash" or "phash".
+
+    Returns:
+    - list: The hashes, None for the images that can not be decoded.
+    """
+
+    return [image_hash(x, method) for x in paths]
+
+def hash_files(paths: list[str], method: str = "dhash", workers: int = None) -> list:
+    """
+    Compute the perceptual hashes of several images in a pool of worker processes.
+
+    Parameters:
+    - paths (list[str]): The paths to the images.
+    - method (str): "dhash" or "phash".
+    - workers (int): Number of worker processes, None to use every CPU.
+
+    Returns:
+    - list: The hashes in the same order, None for the images that can not be decoded.
+    """
+
+    return pool_map(_hash_chunk, paths, (method, ), workers, "Hashed")
+
+def hamming(a: int, b: int) -> int:
+    """
+    Get the Hamming distance between two hashes.
+
+    Parameters:
+    - a (int): The first hash.
+    - b (int): The second hash.
+
+    Returns:
+    - int: Number of different bits.
+    """
+
+    return bin(a ^ b).count("1")
+
+class BKTree(object):
+    def __init__(self) -> None:
+        """
+        Initialize an empty BK-tree, which finds the hashes within a Hamming distance without comparing every hash.
+        """
+
+        # Every node is [hash, key, {distance: child}]
+        self.root = None
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, value: int, key) -> None:
+        """
+        Add a hash to the tree.
+
+        Parameters:
+        - value (int): The hash.
+        - key: The value returned by the searches, e.g. the image path.
+        """
+
+        node = [value, key, {}]
+        self.size += 1
+
+        if self.root is None:
+            self.root = node
+            return
+
+        current = self.root
+
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+
+            if child is None:
+                current[2][distance] = node
+                return
+
+            current = child
+
+    def search(self, value: int, radius: int) -> list:
+        """
+        Find the hashes within a Hamming distance.
+
+        Parameters:
+        - value (int): The hash searched.
+        - radius (int): Maximum Hamming distance.
+
+        Returns:
+        - list: (distance, key) of every match, closest first.
+        """
+
+        if self.root is None:
+            return []
+
+        matches = [].copy()
+        stack = [self.root]
+
+        while len(stack) > 0:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+
+            if distance <= radius:
+                matches.append((distance, node[1]))
+
+            # By the triangle inequality, only these children can hold matches
+            for d, child in node[2].items():
+                if distance - radius <= d <= distance + radius:
+                    stack.append(child)
+
+        return sorted(matches, key = lambda x: x[0])
+
+class HashIndex(ContentCache):
+    def __init__(self, path: str, method: str = "dhash") -> None:
+        """
+        Initialize a persistent index of perceptual hashes keyed by the content hash of the files.
+
+        Parameters:
+        - path (str): The JSON file of the index, loaded if it exists with the same method.
+        - method (str): "dhash" or "phash".
+        """
+
+        super().__init__(path, {"method": method})
+
+        self.method = method
+
+    def compute(self, paths: list[str], workers: int = None) -> list:
+        """
+        Compute the perceptual hashes of several images, see ContentCache.compute.
+        """
+
+        return hash_files(paths, self.method, workers)
@@ -0,0 +1,183 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+def digest(data) -> str:
+    """
+    Compute the content hash used as cache key.
+
+    Parameters:
+    - data: Bytes or any object supporting the buffer protocol (e.g. a contiguous array).
+
+    Returns:
+    - str: The hexadecimal digest.
+    """
+
+    return hashlib.blake2b(data, digest_size = 16).hexdigest()
+
+class LRUCache(object):
+
+    def __init__(self, *, max_entries: int = 4096, ttl: float = 3600) -> None:
+        """
+        Thread-safe least recently used cache with expiration and hit/miss counters.
+
+        Parameters:
+        - max_entries (int): Maximum number of entries kept in memory.
+        - ttl (float): Seconds an entry stays valid, None to never expire.
+        """
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """
+        Get an entry, marking it as recently used.
+
+        Parameters:
+        - key (str): The key of the entry.
+
+        Returns:
+        - The cached value, or None if it is missing or expired.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+                # Drop expired entries
+                if entry is not None:
+                    del self._entries[key]
+
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[1]
+
+    def put(self, key: str, value) -> None:
+        """
+        Store an entry, evicting the least recently used ones when the cache is full.
+
+        Parameters:
+        - key (str): The key of the entry.
+        - value: The value to store.
+        """
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last = False)
+
+    def clear(self) -> None:
+        """
+        Remove every entry.
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the usage counters of the cache.
+
+        Returns:
+        - dict: Number of entries, hits and misses.
+        """
+
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+class PredictionCache(object):
+
+    def __init__(self, *, max_entries: int = 4096, ttl: float = 3600) -> None:
+        """
+        Two level prediction cache: by hash of the uploaded bytes and by hash of the prepared image.
+
+        Every entry belongs to a version of the models, the cache is emptied when a different version is used.
+
+        Parameters:
+        - max_entries (int): Maximum number of entries of each level.
+        - ttl (float): Seconds an entry stays valid, None to never expire.
+        """
+
+        self.images = LRUCache(max_entries = max_entries, ttl = ttl)
+        self.features = LRUCache(max_entries = max_entries, ttl = ttl)
+        self.version = None
+
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: str) -> None:
+        """
+        Empty the cache if the models changed.
+
+        Parameters:
+        - version (str): The version of the models in use.
+        """
+
+        with self._lock:
+            if version == self.version:
+                return
+
+            print(f"[INFO] Models changed to version {version}, clearing the prediction cache")
+
+            self.images.clear()
+            self.features.clear()
+            self.version = version
+
+    def get(self, level: LRUCache, key: str, version: str):
+        """
+        Get a prediction from one level of the cache.
+
+        Parameters:
+        - level (LRUCache): Either images or features.
+        - key (str): The content hash.
+        - version (str): The version of the models in use.
+
+        Returns:
+        - The cached prediction, or None if it is not cached.
+        """
+
+        if key is None:
+            return None
+
+        self._check_version(version)
+
+        return level.get(key)
+
+    def put(self, level: LRUCache, key: str, version: str, value) -> None:
+        """
+        Store a prediction in one level of the cache.
+
+        Parameters:
+        - level (LRUCache): Either images or features.
+        - key (str): The content hash.
+        - version (str): The version of the models used for the prediction.
+        - value: The prediction.
+        """
+
+        if key is None:
+            return
+
+        self._check_version(version)
+
+        level.put(key, value)
+
+    def stats(self) -> dict:
+        """
+        Get the usage counters of both levels.
+
+        Returns:
+        - dict: Counters of the images and features levels.
+        """
+
+        return {"version": self.version, "images": self.images.stats(), "features": self.features.stats()}
@@ -0,0 +1,49 @@
+import os
+import time
+import concurrent.futures
+
+def chunk_size(count: int, workers: int, max_chunk: int = 256) -> int:
+    """
+    Get the number of items per task: about four tasks per worker to balance the load, within the limits.
+
+    Parameters:
+    - count (int): Number of items to process.
+    - workers (int): Number of worker processes.
+    - max_chunk (int): Maximum number of items per task.
+
+    Returns:
+    - int: Items per task.
+    """
+
+    return max(1, min(max_chunk, -(-count // (workers * 4))))
+
+def pool_map(func, items: list, args: tuple = (), workers: int = None, action: str = "Processed") -> list:
+    """
+    Apply a function to chunks of items in a pool of worker processes.
+
+    Parameters:
+    - func (callable): Module level function called as func(chunk, *args), returning one result per item of the chunk.
+    - items (list): The items, e.g. the paths to the images.
+    - args (tuple): The other arguments of the function, the same for every chunk.
+    - workers (int): Number of worker processes, None to use every CPU.
+    - action (str): The verb logged with the number of items, e.g. "Hashed".
+
+    Returns:
+    - list: The results in the same order as the items.
+    """
+
+    if len(items) == 0:
+        return []
+
+    workers = min(workers or os.cpu_count(), len(items))
+    chunk = chunk_size(len(items), workers)
+    chunks = [items[x: x + chunk] for x in range(0, len(items), chunk)]
+
+    time_start = time.time()
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+        results = [r for result in executor.map(func, chunks, *[[x] * len(chunks) for x in args]) for r in result]
+
+    print(f"[INFO] {action} {len(items)} images in {time.time() - time_start} seconds ({workers} workers)")
+
+    return results
@@ -0,0 +1,281 @@
+import os
+import time
+import hashlib
+import threading
+import numpy as np
+from fused import FusedSVC
+from compact_model import CompactSVC
+from feature_stage import FEATURE_STAGE_NAME
+from metrics import MODEL_SECONDS, STAGE_SECONDS
+
+def load_model(path: str):
+    """
+    Load a model from disk, either a joblib pickle or a compact model.
+
+    Parameters:
+    - path (str): The model file.
+
+    Returns:
+    - The loaded model.
+    """
+
+    if path.endswith(".joblib"):
+        # Only pay for the sklearn import when pickled models are used
+        import joblib
+
+        return joblib.load(path)
+
+    return CompactSVC(path)
+
+def models_signature(path: str, suffix: str) -> tuple:
+    """
+    Build a signature of the model files inside a directory, including the feature stage.
+
+    Parameters:
+    - path (str): The models directory.
+    - suffix (str): Only files ending with this suffix are considered models.
+
+    Returns:
+    - tuple: Sorted (name, inode, mtime, size) entries, empty if the directory does not exist.
+    """
+
+    entries = [].copy()
+
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                # Skip hidden and staging files
+                if entry.name.startswith(".") or not (entry.name.endswith(suffix) or entry.name == FEATURE_STAGE_NAME) or not entry.is_file():
+                    continue
+
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_ino, stat.st_mtime_ns, stat.st_size))
+
+    except FileNotFoundError:
+        return ()
+
+    return tuple(sorted(entries))
+
+class ModelSet(object):
+
+    def __init__(self, *, version: str, models: dict, fused: bool = False, stage = None) -> None:
+        """
+        Immutable snapshot of the models loaded from the models directory.
+
+        Parameters:
+        - version (str): Identifier of the files the snapshot was loaded from.
+        - models (dict): Loaded models indexed by file name.
+        - fused (bool): Whether to evaluate all the models in a single kernel pass when possible.
+        - stage (FeatureStage): The feature stage the models were trained on, None if they use raw pixels.
+        """
+
+        self.version = version
+        self.stage = stage
+        self.labels = [].copy()
+        self.models = [].copy()
+
+        for name in sorted(models.keys()):
+            model = models[name]
+
+            # Find the index of the label that is not "other"
+            non_other_index = np.where(model.classes_ != "other")[0][0]
+
+            self.labels.append(str(model.classes_[non_other_index]))
+            self.models.append((model, non_other_index))
+
+        self.fused = None
+
+        if fused and len(self.models) > 0:
+            self.fused = self._fuse()
+
+    def _fuse(self) -> FusedSVC:
+        """
+        Build the fused predictor and check it reproduces the probabilities of the models.
+
+        Returns:
+        - FusedSVC: The fused predictor, or None if the models can not be fused.
+        """
+
+        # Stacking the memory-mapped support vectors would give every process a private copy of them
+        if any(isinstance(model, CompactSVC) for model, _ in self.models):
+            print("[INFO] Compact models are not fused, evaluating them one by one to share their memory-mapped support vectors")
+            return None
+
+        fused = FusedSVC.from_models(self.models, self.labels)
+
+        if fused is None:
+            print("[INFO] Models can not be fused, evaluating them one by one")
+            return None
+
+        # Use some support vectors as sample images
+        images = np.vstack([g["vectors"][: 8] for g in fused.groups])
+
+        if not fused.verify(self.models, images):
+            print("[ERROR] Fused predictor does not match the models, evaluating them one by one")
+            return None
+
+        print(f"[INFO] Fused {len(self.models)} models: {fused.num_unique_vectors} unique support vectors out of {fused.num_vectors}")
+
+        return fused
+
+    def predict_proba(self, images) -> np.ndarray:
+        """
+        Compute the probability of every label for a batch of images.
+
+        Parameters:
+        - images: Matrix with one flattened image per row.
+
+        Returns:
+        - np.ndarray: Matrix with one row per image and one column per label.
+        """
+
+        # Same features as the training images
+        if self.stage is not None:
+            with STAGE_SECONDS.time("features"):
+                images = self.stage.transform(images)
+
+        if self.fused is not None:
+            with MODEL_SECONDS.time("fused"):
+                return self.fused.predict_proba(images)
+
+        results = np.zeros((len(images), len(self.models)))
+
+        for x, (model, non_other_index) in enumerate(self.models):
+            with MODEL_SECONDS.time(self.labels[x]):
+                results[:, x] = model.predict_proba(images)[:, non_other_index]
+
+        return results
+
+class ModelRegistry(object):
+
+    def __init__(self, *, path: str, suffix: str, interval: float = 5, fused: bool = False) -> None:
+        """
+        Keep the models of a directory loaded in memory and reload them when the files change.
+
+        Parameters:
+        - path (str): The models directory.
+        - suffix (str): Only files ending with this suffix are loaded.
+        - interval (float): Seconds between checks of the models directory.
+        - fused (bool): Whether to evaluate all the models in a single kernel pass when possible.
+        """
+
+        self.path = path
+        self.suffix = suffix
+        self.interval = interval
+        self.fused = fused
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pending = None
+
+        signature = models_signature(self.path, self.suffix)
+        self._signature = signature
+        self._current = self._load(signature)
+
+    def _load(self, signature: tuple) -> ModelSet:
+        """
+        Load every model of a signature from disk.
+
+        Parameters:
+        - signature (tuple): The signature returned by models_signature.
+
+        Returns:
+        - ModelSet: The loaded models.
+        """
+
+        time_start = time.time()
+        models = {}
+        stage = None
+
+        for name, _, _, _ in signature:
+            if name == FEATURE_STAGE_NAME:
+                stage = load_model(os.path.join(self.path, name))
+            else:
+                models[name] = load_model(os.path.join(self.path, name))
+
+        version = hashlib.sha1(repr(signature).encode("utf-8")).hexdigest()[: 12]
+
+        print(f"[INFO] Loaded {len(models)} models (version {version}{', feature stage ' + stage.method if stage is not None else ''}) in {time.time() - time_start} seconds")
+
+        return ModelSet(version = version, models = models, fused = self.fused, stage = stage)
+
+    def get(self) -> ModelSet:
+        """
+        Get the current models. Callers keep using the returned snapshot even if a reload happens meanwhile.
+
+        Returns:
+        - ModelSet: The current models.
+        """
+
+        return self._current
+
+    def check(self) -> bool:
+        """
+        Reload the models if the directory changed.
+
+        A change must be observed on two consecutive checks before it is loaded, so models still being written are not picked up.
+
+        Returns:
+        - bool: True if a new version of the models was loaded, False otherwise.
+        """
+
+        signature = models_signature(self.path, self.suffix)
+
+        # Nothing changed since the last load
+        if signature == self._signature:
+            self._pending = None
+            return False
+
+        # Wait until the directory is stable
+        if signature != self._pending:
+            self._pending = signature
+            return False
+
+        with self._lock:
+            try:
+                models = self._load(signature)
+
+            except Exception as e:
+                # Keep serving the previous models
+                print(f"[ERROR] Unable to reload the models from {self.path}: {e}")
+                self._pending = None
+                return False
+
+            self._current = models
+            self._signature = signature
+            self._pending = None
+
+        return True
+
+    def _watch(self) -> None:
+        """
+        Check the models directory until the registry is stopped.
+        """
+
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self) -> None:
+        """
+        Start watching the models directory in a background thread.
+        """
+
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target = self._watch, name = "model-registry", daemon = True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop watching the models directory.
+        """
+
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,189 @@
+import os
+import time
+import numpy as np
+import concurrent.futures
+from multiprocessing import shared_memory
+from imaging import IMAGE_SIZE, load_image
+from process_pool import chunk_size
+
+# Length of every flattened image
+IMAGE_LENGTH = IMAGE_SIZE[0] * IMAGE_SIZE[1] * 3
+
+def _load_chunk(shm_name: str, shape: tuple, start: int, paths: list[str]) -> list[bool]:
+    """
+    Decode a chunk of images straight into the shared matrix (run in a worker process).
+
+    Parameters:
+    - shm_name (str): The name of the shared memory block.
+    - shape (tuple): The shape of the shared matrix.
+    - start (int): The row of the first image of the chunk.
+    - paths (list[str]): The paths to the images.
+
+    Returns:
+    - list[bool]: Whether every image was decoded.
+    """
+
+    # Workers share the resource tracker of the parent, which unlinks the block
+    shm = shared_memory.SharedMemory(name = shm_name)
+
+    try:
+        matrix = np.ndarray(shape, dtype = np.uint8, buffer = shm.buf)
+        decoded = [].copy()
+
+        for x, path in enumerate(paths):
+            image = load_image(path)
+
+            if image is not None:
+                matrix[start + x] = image
+
+            decoded.append(image is not None)
+
+        del matrix
+
+        return decoded
+
+    finally:
+        shm.close()
+
+class SharedMemoryLoader(object):
+
+    def __init__(self, *, workers: int = None, max_chunk: int = 256, max_window: int = 4096) -> None:
+        """
+        Decode images with a persistent pool of processes writing into a shared uint8 matrix.
+
+        Parameters:
+        - workers (int): Number of worker processes, None to use every CPU.
+        - max_chunk (int): Maximum number of images per task.
+        - max_window (int): Maximum number of images decoded at once, which bounds the size of the shared matrix.
+        """
+
+        self.workers = workers or os.cpu_count()
+        self.max_chunk = max_chunk
+        self.max_window = max_window
+
+        self._executor = None
+
+    def _pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        """
+        Get the worker pool, creating it the first time.
+
+        Returns:
+        - ProcessPoolExecutor: The worker pool.
+        """
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers = self.workers)
+
+        return self._executor
+
+    def chunk_size(self, count: int) -> int:
+        """
+        Get the number of images per task: about four tasks per worker to balance the load, within the limits.
+
+        Parameters:
+        - count (int): Number of images to load.
+
+        Returns:
+        - int: Images per task.
+        """
+
+        return chunk_size(count, self.workers, self.max_chunk)
+
+    def load(self, paths: list[str], out: np.ndarray = None) -> tuple:
+        """
+        Decode a list of images, a window of at most max_window images at a time.
+
+        Parameters:
+        - paths (list[str]): The paths to the images.
+        - out (np.ndarray): Preallocated uint8 matrix (len(paths), IMAGE_LENGTH) receiving the images, e.g. a slice of
+          a larger matrix or a memory-mapped file, None to allocate it.
+
+        Returns:
+        - tuple: The uint8 matrix with one flattened image per row and a boolean mask of the decoded images.
+        """
+
+        count = len(paths)
+
+        if out is None:
+            out = np.empty((count, IMAGE_LENGTH), dtype = np.uint8)
+
+        if count == 0:
+            return out, np.zeros(0, dtype = bool)
+
+        time_start = time.time()
+
+        window = min(count, self.max_window)
+        shape = (window, IMAGE_LENGTH)
+        decoded = np.zeros(count, dtype = bool)
+
+        shm = shared_memory.SharedMemory(create = True, size = window * IMAGE_LENGTH)
+        buffer = np.ndarray(shape, dtype = np.uint8, buffer = shm.buf)
+
+        try:
+            for offset in range(0, count, window):
+                part = paths[offset: offset + window]
+                chunk = self.chunk_size(len(part))
+                futures = [self._pool().submit(_load_chunk, shm.name, shape, start, part[start: start + chunk]) for start in range(0, len(part), chunk)]
+
+                decoded[offset: offset + len(part)] = [ok for future in futures for ok in future.result()]
+
+                # Single copy of every window out of the shared block
+                out[offset: offset + len(part)] = buffer[: len(part)]
+
+        finally:
+            del buffer
+            shm.close()
+            shm.unlink()
+
+        duration = time.time() - time_start
+
+        print(f"[INFO] Loaded {count} images in {duration} seconds ({count / max(duration, 1e-9):.1f} images/sec, {self.workers} workers, {self.chunk_size(window)} images per task)")
+
+        return out, decoded
+
+    def close(self) -> None:
+        """
+        Stop the worker processes.
+        """
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+def compact_rows(matrix: np.ndarray, mask: np.ndarray, chunk: int = 1024) -> int:
+    """
+    Move the selected rows of a matrix to its beginning in place, without copying the whole matrix.
+
+    Parameters:
+    - matrix (np.ndarray): The matrix, e.g. the images returned by load.
+    - mask (np.ndarray): Boolean mask of the rows to keep, e.g. the decoded images.
+    - chunk (int): Number of rows moved at a time.
+
+    Returns:
+    - int: Number of rows kept, which are matrix[: count].
+    """
+
+    rows = np.flatnonzero(mask)
+
+    # Every row moves to a lower or equal position, and each chunk is read before it is written
+    for start in range(0, len(rows), chunk):
+        matrix[start: start + len(rows[start: start + chunk])] = matrix[rows[start: start + chunk]]
+
+    return len(rows)
+
+_default_loader = None
+
+def default_loader() -> SharedMemoryLoader:
+    """
+    Get the loader shared by the whole process.
+
+    Returns:
+    - SharedMemoryLoader: The shared loader.
+    """
+
+    global _default_loader
+
+    if _default_loader is None:
+        _default_loader = SharedMemoryLoader()
+
+    return _default_loader
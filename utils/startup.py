@@ -0,0 +1,58 @@
+import os
+import time
+from contextlib import contextmanager
+
+class StartupTimer(object):
+
+    def __init__(self) -> None:
+        """
+        Measure the duration of every startup phase.
+        """
+
+        self.time_start = time.perf_counter()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Measure the duration of a block of code.
+
+        Parameters:
+        - name (str): The name of the phase.
+        """
+
+        time_start = time.perf_counter()
+
+        try:
+            yield
+
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - time_start
+
+    def report(self) -> None:
+        """
+        Print the duration of every phase and the total startup time.
+        """
+
+        phases = ", ".join(f"{name} {duration:.3f}s" for name, duration in self.phases.items())
+
+        print(f"[INFO] Startup finished in {time.perf_counter() - self.time_start:.3f} seconds ({phases})")
+
+def mark_ready(path: str, ready: bool = True) -> None:
+    """
+    Create or remove the file signaling that the service is ready.
+
+    Parameters:
+    - path (str): The readiness file, None to not signal anything.
+    - ready (bool): Whether the service is ready.
+    """
+
+    if path is None:
+        return
+
+    if ready:
+        with open(path, "w") as f:
+            f.write(str(os.getpid()))
+
+    elif os.path.exists(path):
+        os.remove(path)
@@ -1,7 +1,11 @@
 import os
 import sys
+import errno
 import shutil
 
+# ioctl cloning the extents of a file (reflink) on Linux filesystems such as Btrfs and XFS
+FICLONE = 0x40049409
+
 def stop_print(func, *args, **kwargs):
     """
     Temporarily suppress the standard output while executing a function.
@@ -92,80 +96,64 @@ def delete_path(p: str = None, f: bool = False) -> bool:
         print(f"[ERROR] Unable to delete path {p}: {e}")
         return False
 
-def copy_path(p: str = None, d: str = None) -> bool:
+def reflink_file(p: str, d: str) -> bool:
     """
-    Copy a directory to another path.
+    Clone a file sharing its data blocks with the original (copy-on-write).
 
     Parameters:
-    - p (str): The origin path.
-    - d (str): The destination path.
+    - p (str): The origin file.
+    - d (str): The destination file.
 
     Returns:
-    - bool: True if the path is copied, False otherwise.
+    - bool: True if the file is cloned, False if the filesystem does not support it.
     """
 
-    # Check if the path or the destination is not specified
-    if p == None or d == None:
-        print("[INFO] No path or destination specified")
-        return False
+    try:
+        import fcntl
 
-    # Check if the path exists
-    if not os.path.exists(p):
-        print(f"[INFO] Path {p} does not exist")
+    except ImportError:
         return False
 
     try:
-        # Ensure that the destination exists
-        os.makedirs(d, exist_ok = True)
-
-        # Copy every file
-        for item in os.listdir(p):
-            source_item = os.path.join(p, item)
-            destination_item = os.path.join(d, item)
+        with open(p, "rb") as source, open(d, "wb") as destination:
+            fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
 
-            # If it is a directory, call this function
-            if os.path.isdir(source_item):
-                copy_path(source_item, destination_item)
-            else:
-                shutil.copy2(source_item, destination_item)
+    except OSError:
+        if os.path.exists(d):
+            os.remove(d)
 
-        print(f"[INFO] Folder {p} successfully copied to {d}")
-        return True
-    except Exception as e:
-        print(f"[ERROR] Folder {p} was not copied to {d}")
         return False
 
-def delete_files(f: list[str] = None) -> bool:
-    """Deletes one or more files.
+    shutil.copystat(p, d)
+
+    return True
+
+def link_file(p: str, d: str) -> str:
+    """
+    Make a file available at another path without duplicating its data when possible.
+
+    Hardlinks are used on the same filesystem, reflinks where hardlinks are not allowed, and copies across filesystems.
 
     Parameters:
-    - f (List[str]): A list of files to delete. If not specified, no files will be deleted.
+    - p (str): The origin file.
+    - d (str): The destination file.
 
     Returns:
-    - bool: True if all files were successfully deleted, False otherwise.
+    - str: The method used: "link", "reflink" or "copy".
     """
 
-    # Check if the list is not specified
-    if f == None:
-        print("[INFO] No files specified")
-        return False
-
-    # Convert single string to list
-    if type(f) == "str":
-        f = [f]
-    
-    # Try to delete the files
     try:
-        for file in f:
-            if os.path.exists(file):
-                os.remove(file)
-                print(f"[INFO] File {file} deleted successfully")
-            else:
-                print(f"[INFO] File {file} does not exist")
-    
-        print("[INFO] Files deleted successfully")
-        return True
-    
-    except Exception as e:
-        print("[ERROR] Files were not deleted")
-        return False
+        os.link(p, d)
+        return "link"
+
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP):
+            raise
+
+        # Reflinks can not cross filesystems either
+        if e.errno != errno.EXDEV and reflink_file(p, d):
+            return "reflink"
+
+    shutil.copy2(p, d)
+
+    return "copy"